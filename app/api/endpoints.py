@@ -1,15 +1,22 @@
+import logging
 from typing import Optional
 
 from fastapi import APIRouter, Request, Depends, HTTPException, Query
 from fastapi.responses import RedirectResponse
+from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.setting import settings
+from app.db.redis import get_redis
 from app.db.session import get_session
 from app.schemas.url import ShortenRequest, ShortenResponse, StatsResponse
 from app.services import url_service
+from app.services.visit_tracker import VisitTracker, get_visit_tracker
 
 router = APIRouter()
 
+redirect_logger = logging.getLogger("url_shortener.redirect")
+
 
 @router.post("/shorten", response_model=ShortenResponse, status_code=201)
 async def create_short_url(
@@ -18,8 +25,8 @@ async def create_short_url(
     session: AsyncSession = Depends(get_session)
 ):
     """Create a shortened URL."""
-    # Get base URL from request
-    base_url = str(request.base_url).rstrip('/')
+    # Configured public origin (already normalized), else the request's base URL
+    base_url = settings.PUBLIC_BASE_URL or str(request.base_url).rstrip('/')
     
     try:
         result = await url_service.shorten_url(
@@ -44,14 +51,16 @@ async def get_url_stats(
         le=30,
         description="Number of days of daily stats to include (max 30)"
     ),
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_session),
+    redis: Optional[Redis] = Depends(get_redis)
 ):
     """Get stats for a shortened URL."""
     try:
         stats = await url_service.fetch_stats(
             session=session,
             short_code=short_code,
-            days=days
+            days=days,
+            redis=redis
         )
         return stats
     except url_service.URLNotFound as e:
@@ -61,7 +70,8 @@ async def get_url_stats(
 @router.head("/{short_code}", include_in_schema=False)
 async def redirect_head(
     short_code: str,
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_session),
+    redis: Optional[Redis] = Depends(get_redis)
 ):
     """
     HEAD request for redirect - returns redirect headers without tracking.
@@ -74,7 +84,8 @@ async def redirect_head(
     try:
         url = await url_service.resolve_only(
             session=session,
-            short_code=short_code
+            short_code=short_code,
+            redis=redis
         )
         return RedirectResponse(url=url.original_url, status_code=307)
     except url_service.URLNotFound as e:
@@ -85,30 +96,30 @@ async def redirect_head(
 async def redirect_to_url(
     short_code: str,
     request: Request,
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_session),
+    redis: Optional[Redis] = Depends(get_redis),
+    tracker: Optional[VisitTracker] = Depends(get_visit_tracker)
 ):
     """
-    Redirect to the original URL and track the visit.
+    Redirect to the original URL, track the visit and log code and client IP.
     
     Returns a 307 Temporary Redirect to the original URL.
     """
-    # Get client IP, with proxy-aware handling
-    # Check for X-Forwarded-For header first (set by reverse proxies)
-    forwarded_for = request.headers.get("X-Forwarded-For")
-    if forwarded_for:
-        # X-Forwarded-For can contain multiple IPs: client, proxy1, proxy2, ...
-        # The first IP is the original client
-        client_ip = forwarded_for.split(",")[0].strip()
-    else:
-        client_ip = request.client.host if request.client else "unknown"
+    # X-Forwarded-For from trusted proxies is already applied to
+    # request.client by ProxyHeadersMiddleware
+    client_ip = request.client.host if request.client else "unknown"
     
     try:
         url = await url_service.resolve_and_track(
             session=session,
             short_code=short_code,
-            client_ip=client_ip
+            client_ip=client_ip,
+            redis=redis,
+            tracker=tracker
         )
-        return RedirectResponse(url=url.original_url, status_code=307)
     except url_service.URLNotFound as e:
         raise HTTPException(status_code=404, detail=str(e))
+    
+    redirect_logger.info("%s | %s", short_code, client_ip)
+    return RedirectResponse(url=url.original_url, status_code=307)
 
@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, Response
-from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.session import get_session
 
 router = APIRouter()
 
+# Sent straight to the driver; probes skip SQLAlchemy statement compilation
+_PING = "SELECT 1"
+
 
 @router.get("/healthz")
 async def health_check():
@@ -34,7 +36,8 @@ async def readiness_check(
     """
     # Check database connectivity
     try:
-        result = await session.execute(text("SELECT 1"))
+        conn = await session.connection()
+        result = await conn.exec_driver_sql(_PING)
         result.scalar_one()
     except Exception as e:
         response.status_code = 503
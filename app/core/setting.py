@@ -3,7 +3,7 @@ from __future__ import annotations
 from enum import Enum
 from pathlib import Path
 
-from pydantic import Field
+from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 __all__ = ["Settings", "settings"]
@@ -26,14 +26,58 @@ class Settings(BaseSettings):
     ENV_SETTING: EnvSettingsOptions = Field(
         "production", examples=["production", "staging", "dev"]
     )
+    # Public origin for short URLs, e.g. https://sho.rt; defaults to the request's base URL
+    PUBLIC_BASE_URL: str | None = Field(default=None)
+    # Comma-separated proxy IPs/networks whose X-Forwarded-For is trusted ("*" for any)
+    FORWARDED_ALLOW_IPS: str = Field(default="127.0.0.1")
     # asyncpg DSN, URL-encode special chars in password
     PG_DSN: str | None = Field(default=None)
     
-    DB_POOL_SIZE: int = Field(default=5)
-    DB_MAX_OVERFLOW: int = Field(default=10)
-    DB_POOL_PRE_PING: bool = Field(default=True)
-    DB_POOL_RECYCLE: int = Field(default=3600)
+    DB_POOL_SIZE: int = Field(default=20)
+    DB_MAX_OVERFLOW: int = Field(default=40)
+    DB_POOL_TIMEOUT: int = Field(default=30)
+    # Pre-ping costs a round-trip per checkout; recycling connections before
+    # server/proxy idle timeouts replaces most stale ones without it. A
+    # connection dropped by a DB restart or failover still fails on first
+    # use: queued visit batches are retried, but an inline request errors.
+    # Turn pre-ping on if that trade isn't acceptable.
+    DB_POOL_PRE_PING: bool = Field(default=False)
+    DB_POOL_RECYCLE: int = Field(default=1800)
     DB_ECHO: bool = Field(default=False)
+    # Open DB_POOL_SIZE connections at startup
+    DB_POOL_WARMUP: bool = Field(default=True)
+    # asyncpg connect / per-statement timeouts, in seconds
+    DB_CONNECT_TIMEOUT: int = Field(default=10)
+    DB_COMMAND_TIMEOUT: int = Field(default=60)
+    # Server-side statement_timeout for app connections, in milliseconds (0 disables)
+    DB_STATEMENT_TIMEOUT_MS: int = Field(default=5000)
+    # Prepared statements kept per connection, so repeated queries skip parse/plan
+    DB_STATEMENT_CACHE_SIZE: int = Field(default=256)
+
+    # Redis DSN, leave unset to disable caching
+    REDIS_URL: str | None = Field(default=None)
+    URL_CACHE_TTL: int = Field(default=3600)
+    STATS_CACHE_TTL: int = Field(default=30)
+
+    # Background visit tracking, disable to write visits inside the request
+    VISIT_QUEUE_ENABLED: bool = Field(default=True)
+    VISIT_QUEUE_MAX_SIZE: int = Field(default=10000)
+    VISIT_FLUSH_BATCH_SIZE: int = Field(default=500)
+    VISIT_FLUSH_INTERVAL_MS: int = Field(default=50)
+    # Keep a url_visits row per visit; with Redis, unique visitors are
+    # counted in HyperLogLogs (PFCOUNT persisted to urls.unique_visitors on
+    # each write) so this can be turned off to save DB writes. See sample.env
+    # for what is lost if Redis drops the keys.
+    VISIT_ROWS_ENABLED: bool = Field(default=True)
+    # url_visits monthly partitions: future months to pre-create, months to keep (0 = all)
+    VISIT_PARTITION_MONTHS_AHEAD: int = Field(default=2)
+    VISIT_RETENTION_MONTHS: int = Field(default=0)
+
+
+    @field_validator("PUBLIC_BASE_URL")
+    @classmethod
+    def strip_trailing_slash(cls, v: str | None) -> str | None:
+        return v.rstrip("/") if v else v
 
 
 settings = Settings()
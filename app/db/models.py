@@ -2,6 +2,7 @@ from datetime import datetime, date
 from typing import Optional
 
 from sqlalchemy import (
+    DDL,
     Column,
     Integer,
     BigInteger,
@@ -12,9 +13,11 @@ from sqlalchemy import (
     Index,
     UniqueConstraint,
     ForeignKey,
+    event,
     func,
     text,
 )
+from sqlalchemy.dialects.postgresql import INET
 from sqlmodel import SQLModel, Field
 
 
@@ -25,7 +28,7 @@ class URL(SQLModel, table=True):
 
     id: Optional[int] = Field(default=None, primary_key=True)
     original_url: str = Field(sa_column=Column(Text, nullable=False))
-    short_code: str = Field(sa_column=Column(String(20), nullable=False, unique=True, index=True))
+    short_code: str = Field(sa_column=Column(String(20), nullable=False))
     created_at: datetime = Field(
         sa_column=Column(DateTime(timezone=True), nullable=False, server_default=func.now())
     )
@@ -33,29 +36,60 @@ class URL(SQLModel, table=True):
     last_visited_at: Optional[datetime] = Field(
         default=None, sa_column=Column(DateTime(timezone=True), nullable=True)
     )
+    # Last PFCOUNT of the Redis HyperLogLog, persisted with each visit write
+    # so unique visitors survive losing the key
+    unique_visitors: Optional[int] = Field(default=None, sa_column=Column(BigInteger, nullable=True))
 
     __table_args__ = (
         Index("ix_urls_created_at", "created_at"),
+        # Covers the redirect lookup (id, original_url by short_code) as an index-only scan
+        Index(
+            "ix_urls_short_code_covering",
+            "short_code",
+            unique=True,
+            postgresql_include=["id", "original_url"],
+        ),
     )
 
 
 class URLVisit(SQLModel, table=True):
-    """Individual visit records."""
+    """
+    Individual visit records.
+    
+    Range-partitioned by month on visited_at (see app/db/partitions.py), so
+    inserts stay in one small partition and retention is a DROP TABLE.
+    """
 
     __tablename__ = "url_visits"
 
-    id: Optional[int] = Field(default=None, primary_key=True)
+    # The partition key must be part of the primary key
+    id: Optional[int] = Field(
+        default=None, sa_column=Column(Integer, primary_key=True, autoincrement=True)
+    )
     url_id: int = Field(sa_column=Column(Integer, ForeignKey("urls.id", ondelete="CASCADE"), nullable=False))
-    ip: str = Field(sa_column=Column(String(45), nullable=False))  # IPv6 max length is 45
-    visited_at: datetime = Field(
-        sa_column=Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    # NULL when the client address isn't a valid IP (e.g. "unknown")
+    ip: Optional[str] = Field(default=None, sa_column=Column(INET, nullable=True))
+    visited_at: Optional[datetime] = Field(
+        default=None,
+        sa_column=Column(
+            DateTime(timezone=True), primary_key=True, nullable=False, server_default=func.now()
+        ),
     )
 
     __table_args__ = (
         Index("ix_url_visits_url_id_visited_at", "url_id", "visited_at"),
+        {"postgresql_partition_by": "RANGE (visited_at)"},
     )
 
 
+# Catch-all partition so inserts never fail when a month's partition is missing
+event.listen(
+    URLVisit.__table__,
+    "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS url_visits_default PARTITION OF url_visits DEFAULT"),
+)
+
+
 class URLDailyStat(SQLModel, table=True):
     """Daily visit counts per URL."""
 
@@ -67,7 +101,7 @@ class URLDailyStat(SQLModel, table=True):
     count: int = Field(default=0, sa_column=Column(BigInteger, nullable=False, server_default=text("0")))
 
     __table_args__ = (
+        # Its index also serves the stats range scan (backward for day DESC)
         UniqueConstraint("url_id", "day", name="uq_url_daily_stats_url_id_day"),
-        Index("ix_url_daily_stats_url_id_day", "url_id", "day"),
     )
 
@@ -0,0 +1,177 @@
+"""
+Monthly range partitions for url_visits.
+
+Partitions are named url_visits_YYYY_MM and cover [month start, next month
+start) in UTC. The app creates upcoming partitions at startup; for
+long-running deployments schedule this module from cron as well:
+
+    python -m app.db.partitions
+
+It exits non-zero if a partition couldn't be created, so cron reports it.
+"""
+import asyncio
+import logging
+import re
+import sys
+from datetime import date, datetime, time, timezone
+from typing import Optional
+
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.core.setting import settings
+from app.db.session import dispose_engine, get_engine
+
+logger = logging.getLogger("url_shortener.partitions")
+
+_PARTITION_NAME = re.compile(r"^url_visits_(\d{4})_(\d{2})$")
+
+_LIST_PARTITIONS = text("""
+    SELECT child.relname
+    FROM pg_inherits
+    JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    WHERE parent.relname = 'url_visits'
+""")
+
+_DEFAULT_HAS_ROWS = text("""
+    SELECT EXISTS (
+        SELECT 1 FROM url_visits_default WHERE visited_at >= :start AND visited_at < :end
+    )
+""").bindparams(
+    bindparam("start", type_=DateTime(timezone=True)),
+    bindparam("end", type_=DateTime(timezone=True)),
+)
+
+# Runs while url_visits_default is detached, so the rows route to the new partition
+_MOVE_DEFAULT_ROWS = text("""
+    WITH moved AS (
+        DELETE FROM url_visits_default
+        WHERE visited_at >= :start AND visited_at < :end
+        RETURNING id, url_id, ip, visited_at
+    )
+    INSERT INTO url_visits (id, url_id, ip, visited_at)
+    SELECT id, url_id, ip, visited_at FROM moved
+""").bindparams(
+    bindparam("start", type_=DateTime(timezone=True)),
+    bindparam("end", type_=DateTime(timezone=True)),
+)
+
+
+def _month_start(day: date, offset: int = 0) -> date:
+    """First day of the month `offset` months after the one containing `day`."""
+    index = day.year * 12 + day.month - 1 + offset
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    """Name of the url_visits partition holding `month`."""
+    return f"url_visits_{month:%Y_%m}"
+
+
+async def _create_partition(conn: AsyncConnection, start: date, end: date) -> None:
+    bounds = {
+        "start": datetime.combine(start, time(), timezone.utc),
+        "end": datetime.combine(end, time(), timezone.utc),
+    }
+    # Postgres refuses to create a partition for a range url_visits_default
+    # already holds rows for, so move them across with the default detached
+    has_rows = await conn.scalar(_DEFAULT_HAS_ROWS, bounds)
+    if has_rows:
+        await conn.execute(text("ALTER TABLE url_visits DETACH PARTITION url_visits_default"))
+    # DDL can't take bind parameters; the values are generated dates
+    await conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(start)} "
+        f"PARTITION OF url_visits "
+        f"FOR VALUES FROM ('{start} 00:00+00') TO ('{end} 00:00+00')"
+    ))
+    if has_rows:
+        await conn.execute(_MOVE_DEFAULT_ROWS, bounds)
+        await conn.execute(text("ALTER TABLE url_visits ATTACH PARTITION url_visits_default DEFAULT"))
+
+
+async def ensure_visit_partitions(
+    conn: AsyncConnection,
+    months_ahead: int,
+    today: Optional[date] = None
+) -> list[str]:
+    """
+    Create the partitions for the current month and the next `months_ahead`.
+
+    Idempotent. Creating partitions ahead of time keeps url_visits_default
+    empty. If a rotation was missed and the default already holds rows for
+    a month, it is detached while that month's partition is created and the
+    rows are moved into it; this locks url_visits until the caller commits.
+    Each month runs in its own savepoint, so one failure doesn't stop the
+    later months; failures are logged at ERROR.
+
+    Args:
+        conn: Connection to run the DDL on (caller commits)
+        months_ahead: Number of future months to create
+        today: Reference date, defaults to the current UTC date
+
+    Returns:
+        Names of the partitions that couldn't be created
+    """
+    today = today or datetime.now(timezone.utc).date()
+
+    result = await conn.execute(_LIST_PARTITIONS)
+    existing = set(result.scalars())
+    failed = []
+    for offset in range(months_ahead + 1):
+        start = _month_start(today, offset)
+        name = partition_name(start)
+        if name in existing:
+            continue
+        try:
+            async with conn.begin_nested():
+                await _create_partition(conn, start, _month_start(today, offset + 1))
+        except SQLAlchemyError:
+            logger.exception(f"Creating partition {name} failed; its visits stay in url_visits_default")
+            failed.append(name)
+    return failed
+
+
+async def drop_visit_partitions(
+    conn: AsyncConnection,
+    keep_months: int,
+    today: Optional[date] = None
+) -> list[str]:
+    """
+    Drop monthly partitions older than the last `keep_months` months.
+
+    Args:
+        conn: Connection to run the DDL on (caller commits)
+        keep_months: Number of months to keep, including the current one
+        today: Reference date, defaults to the current UTC date
+
+    Returns:
+        Names of the dropped partitions
+    """
+    today = today or datetime.now(timezone.utc).date()
+    cutoff = _month_start(today, 1 - keep_months)
+
+    result = await conn.execute(_LIST_PARTITIONS)
+    dropped = []
+    for name in sorted(result.scalars()):
+        match = _PARTITION_NAME.match(name)
+        if match and date(int(match[1]), int(match[2]), 1) < cutoff:
+            await conn.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+    return dropped
+
+
+async def _rotate() -> int:
+    try:
+        async with get_engine().begin() as conn:
+            failed = await ensure_visit_partitions(conn, settings.VISIT_PARTITION_MONTHS_AHEAD)
+            if settings.VISIT_RETENTION_MONTHS:
+                await drop_visit_partitions(conn, settings.VISIT_RETENTION_MONTHS)
+    finally:
+        await dispose_engine()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_rotate()))
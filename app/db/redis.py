@@ -0,0 +1,28 @@
+from typing import Optional
+
+from redis.asyncio import Redis
+
+from app.core.setting import settings
+
+_redis: Optional[Redis] = None
+
+
+def get_redis_client() -> Optional[Redis]:
+    """Lazily create and return the Redis client, or None if REDIS_URL is not set."""
+    global _redis
+    if _redis is None and settings.REDIS_URL:
+        _redis = Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _redis
+
+
+async def get_redis() -> Optional[Redis]:
+    """FastAPI dependency returning the shared Redis client (None disables caching)."""
+    return get_redis_client()
+
+
+async def close_redis() -> None:
+    """Close the shared Redis client's connections, if one was created."""
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+    _redis = None
@@ -1,12 +1,12 @@
+import asyncio
 from typing import AsyncGenerator, Optional
 
-from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
-from sqlalchemy.orm import sessionmaker
-from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 
 from app.core.setting import settings
 
 _engine: Optional[AsyncEngine] = None
+_session_factory: Optional[async_sessionmaker[AsyncSession]] = None
 
 
 def get_engine() -> AsyncEngine:
@@ -20,25 +20,77 @@ def get_engine() -> AsyncEngine:
             echo=settings.DB_ECHO,
             pool_size=settings.DB_POOL_SIZE,
             max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
             pool_pre_ping=settings.DB_POOL_PRE_PING,
             pool_recycle=settings.DB_POOL_RECYCLE,
+            connect_args={
+                "timeout": settings.DB_CONNECT_TIMEOUT,
+                "command_timeout": settings.DB_COMMAND_TIMEOUT,
+                # SQLAlchemy's asyncpg adapter prepares every statement and
+                # keeps them in a per-connection LRU of this size
+                "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+                # Sent in the startup packet, so they apply once per new
+                # connection without an extra round-trip or a checkout hook
+                "server_settings": {
+                    "application_name": "url_shortener",
+                    "timezone": "UTC",
+                    "statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS),
+                    # Queries are tiny, JIT compilation only adds latency
+                    "jit": "off",
+                    # Server-side keepalives: let Postgres reap connections
+                    # whose client vanished. They don't tell this pool that
+                    # a connection is dead.
+                    "tcp_keepalives_idle": "60",
+                    "tcp_keepalives_interval": "10",
+                    "tcp_keepalives_count": "5",
+                },
+            },
         )
     return _engine
 
 
-def create_async_session():
-    return sessionmaker(
-        bind=get_engine(),
-        autocommit=False,
-        autoflush=False,
-        expire_on_commit=False,
-        class_=AsyncSession,
+def get_session_factory() -> async_sessionmaker[AsyncSession]:
+    """Lazily create and return the shared session factory."""
+    global _session_factory
+    if _session_factory is None:
+        _session_factory = async_sessionmaker(
+            bind=get_engine(),
+            autoflush=False,
+            expire_on_commit=False,
+            class_=AsyncSession,
+        )
+    return _session_factory
+
+
+async def warm_up_pool(size: int) -> None:
+    """
+    Open `size` connections at once and return them to the pool, so the
+    first requests after startup don't pay for connect + auth.
+    """
+    engine = get_engine()
+    conns = [engine.connect() for _ in range(size)]
+    results = await asyncio.gather(
+        *(conn.start() for conn in conns), return_exceptions=True
     )
+    await asyncio.gather(
+        *(conn.close() for conn in conns if conn.sync_connection is not None)
+    )
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+
+async def dispose_engine() -> None:
+    """Close all pooled connections and forget the engine."""
+    global _engine, _session_factory
+    if _engine is not None:
+        await _engine.dispose()
+    _engine = None
+    _session_factory = None
 
 
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
-    async_session = create_async_session()
-    async with async_session() as session:
+    async with get_session_factory()() as session:
         try:
             yield session
         except Exception as e:
@@ -1,13 +1,78 @@
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 
 from app.api import endpoints, health
-from app.middleware.logging import add_logging_middleware
+from app.core.setting import settings
+from app.db.partitions import ensure_visit_partitions
+from app.db.redis import close_redis, get_redis_client
+from app.db.session import dispose_engine, get_engine, get_session_factory, warm_up_pool
+from app.services.visit_tracker import VisitTracker
+
+# Timestamps come from the formatter, so log calls don't build their own
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
+)
+
+logger = logging.getLogger("url_shortener.startup")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pre-open connections so the first requests don't pay for connect/auth.
+    # Failures are only logged: /readyz reports dependency health.
+    if settings.DB_POOL_WARMUP:
+        try:
+            await warm_up_pool(settings.DB_POOL_SIZE)
+        except Exception as e:
+            logger.warning(f"Database pool warm-up failed: {e}")
+    # Missing partitions don't stop the app but send every visit to
+    # url_visits_default, so they're logged as errors rather than warnings
+    try:
+        async with get_engine().begin() as conn:
+            failed = await ensure_visit_partitions(conn, settings.VISIT_PARTITION_MONTHS_AHEAD)
+        if failed:
+            logger.error(f"url_visits partitions missing: {', '.join(failed)}")
+    except Exception:
+        logger.exception("Creating url_visits partitions failed")
+    redis = get_redis_client()
+    if redis is not None:
+        try:
+            await redis.ping()
+        except Exception as e:
+            logger.warning(f"Redis ping failed: {e}")
+
+    tracker = None
+    if settings.VISIT_QUEUE_ENABLED:
+        tracker = VisitTracker(
+            session_factory=get_session_factory(),
+            batch_size=settings.VISIT_FLUSH_BATCH_SIZE,
+            flush_interval=settings.VISIT_FLUSH_INTERVAL_MS / 1000,
+            max_queue_size=settings.VISIT_QUEUE_MAX_SIZE,
+            redis=redis,
+            store_rows=settings.VISIT_ROWS_ENABLED,
+        )
+        tracker.start()
+    app.state.visit_tracker = tracker
+
+    yield
+
+    if tracker is not None:
+        await tracker.stop()
+    await close_redis()
+    await dispose_engine()
 
 
 app = FastAPI(
     title="URL Shortener API",
     description="URL shortening service",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Register routers
@@ -15,4 +80,5 @@ app.include_router(health.router, tags=["health"])
 app.include_router(endpoints.router, tags=["urls"])
 
 # Add middleware
-add_logging_middleware(app)
+# Resolves the client address from X-Forwarded-For before anything reads request.client
+app.add_middleware(ProxyHeadersMiddleware, trusted_hosts=settings.FORWARDED_ALLOW_IPS)
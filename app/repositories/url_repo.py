@@ -1,11 +1,96 @@
-from datetime import datetime, timedelta, timezone
+import ipaddress
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
 from typing import Optional
 
-from sqlalchemy import select, update
+from sqlalchemy import JSON, BigInteger, Date, DateTime, Integer, String, bindparam, func, select, text
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.dialects.postgresql import ARRAY, INET, aggregate_order_by, insert
 
-from app.db.models import URL, URLVisit, URLDailyStat
+from app.db.models import URL, URLDailyStat
+
+# Hot-path statements are built once at import; SQLAlchemy caches their
+# compiled form, so each call only binds parameters.
+_REDIRECT_TARGET = text(
+    "SELECT id, original_url FROM urls WHERE short_code = :short_code"
+).bindparams(bindparam("short_code", type_=String))
+
+_RECORD_VISIT = text("""
+    WITH visit AS (
+        INSERT INTO url_visits (url_id, ip, visited_at)
+        VALUES (:url_id, :ip, :visited_at)
+    ), daily AS (
+        INSERT INTO url_daily_stats (url_id, day, count)
+        VALUES (:url_id, :day, 1)
+        ON CONFLICT (url_id, day) DO UPDATE SET count = url_daily_stats.count + 1
+    )
+    UPDATE urls
+    SET visit_count = visit_count + 1,
+        last_visited_at = :visited_at,
+        unique_visitors = GREATEST(unique_visitors, :unique_visitors)
+    WHERE id = :url_id
+""").bindparams(
+    bindparam("url_id", type_=Integer),
+    bindparam("ip", type_=INET),
+    bindparam("visited_at", type_=DateTime(timezone=True)),
+    bindparam("day", type_=Date),
+    bindparam("unique_visitors", type_=BigInteger),
+)
+
+# Same as _RECORD_VISIT without the url_visits row
+_RECORD_VISIT_COUNTS = text("""
+    WITH daily AS (
+        INSERT INTO url_daily_stats (url_id, day, count)
+        VALUES (:url_id, :day, 1)
+        ON CONFLICT (url_id, day) DO UPDATE SET count = url_daily_stats.count + 1
+    )
+    UPDATE urls
+    SET visit_count = visit_count + 1,
+        last_visited_at = :visited_at,
+        unique_visitors = GREATEST(unique_visitors, :unique_visitors)
+    WHERE id = :url_id
+""").bindparams(
+    bindparam("url_id", type_=Integer),
+    bindparam("visited_at", type_=DateTime(timezone=True)),
+    bindparam("day", type_=Date),
+    bindparam("unique_visitors", type_=BigInteger),
+)
+
+# Batch writes pass one array per column and unnest them server-side, so the
+# SQL text is identical for every batch size and each table is hit once.
+_BATCH_VISIT_INSERT = text("""
+    INSERT INTO url_visits (url_id, ip, visited_at)
+    SELECT * FROM unnest(:url_ids, :ips, :visited_ats)
+""").bindparams(
+    bindparam("url_ids", type_=ARRAY(Integer)),
+    bindparam("ips", type_=ARRAY(INET)),
+    bindparam("visited_ats", type_=ARRAY(DateTime(timezone=True))),
+)
+
+_BATCH_DAILY_UPSERT = text("""
+    INSERT INTO url_daily_stats (url_id, day, count)
+    SELECT * FROM unnest(:url_ids, :days, :counts)
+    ON CONFLICT (url_id, day) DO UPDATE SET count = url_daily_stats.count + EXCLUDED.count
+""").bindparams(
+    bindparam("url_ids", type_=ARRAY(Integer)),
+    bindparam("days", type_=ARRAY(Date)),
+    bindparam("counts", type_=ARRAY(BigInteger)),
+)
+
+_BATCH_URL_COUNTERS_UPDATE = text("""
+    UPDATE urls
+    SET visit_count = urls.visit_count + batch.count,
+        last_visited_at = GREATEST(urls.last_visited_at, batch.last_visited_at),
+        unique_visitors = GREATEST(urls.unique_visitors, batch.unique_visitors)
+    FROM unnest(:url_ids, :counts, :last_visited_ats, :unique_visitors)
+        AS batch(url_id, count, last_visited_at, unique_visitors)
+    WHERE urls.id = batch.url_id
+""").bindparams(
+    bindparam("url_ids", type_=ARRAY(Integer)),
+    bindparam("counts", type_=ARRAY(BigInteger)),
+    bindparam("last_visited_ats", type_=ARRAY(DateTime(timezone=True))),
+    bindparam("unique_visitors", type_=ARRAY(BigInteger)),
+)
 
 
 async def get_by_code(session: AsyncSession, short_code: str) -> Optional[URL]:
@@ -24,13 +109,35 @@ async def get_by_code(session: AsyncSession, short_code: str) -> Optional[URL]:
     return result.scalar_one_or_none()
 
 
-async def create_url(
+async def get_redirect_target(
+    session: AsyncSession,
+    short_code: str
+) -> Optional[tuple[int, str]]:
+    """
+    Retrieve only what a redirect needs, skipping ORM row hydration.
+    
+    Args:
+        session: Async database session
+        short_code: The short code to search for
+        
+    Returns:
+        (id, original_url) if found, None otherwise
+    """
+    result = await session.execute(_REDIRECT_TARGET, {"short_code": short_code})
+    row = result.first()
+    return (row.id, row.original_url) if row else None
+
+
+async def try_create_url(
     session: AsyncSession,
     original_url: str,
     short_code: str
-) -> URL:
+) -> Optional[URL]:
     """
-    Create a new URL entry.
+    Create a new URL entry unless the short code is already taken.
+    
+    Uses INSERT ... ON CONFLICT (short_code) DO NOTHING RETURNING, so a
+    collision neither raises nor aborts the surrounding transaction.
     
     Args:
         session: Async database session
@@ -38,75 +145,135 @@ async def create_url(
         short_code: The short code to use
         
     Returns:
-        The created URL object
+        The created URL object, or None if the code already exists
     """
-    url = URL(
-        original_url=original_url,
-        short_code=short_code
+    stmt = (
+        insert(URL)
+        .values(original_url=original_url, short_code=short_code)
+        .on_conflict_do_nothing(index_elements=['short_code'])
+        .returning(URL)
     )
-    session.add(url)
-    await session.flush()
-    await session.refresh(url)
-    return url
+    result = await session.execute(stmt)
+    return result.scalar_one_or_none()
+
+
+def _inet(ip: str) -> Optional[str]:
+    """Return ip if it parses as an address (url_visits.ip is INET), else None."""
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+    # Postgres INET has no zone ids ("fe80::1%eth0")
+    if getattr(address, "scope_id", None):
+        return None
+    return str(address)
 
 
 async def increment_counters(
     session: AsyncSession,
     url_id: int,
     visited_at_dt: datetime,
-    ip: str
+    ip: str,
+    store_row: bool = True,
+    unique_visitors: Optional[int] = None
 ) -> None:
     """
     Increment visit counters and track the visit.
     
-    This function:
-    1. Inserts a URLVisit record
-    2. Upserts URLDailyStat for the visit day (Postgres ON CONFLICT)
-    3. Updates URL.visit_count and URL.last_visited_at
+    Runs a single statement whose writable CTEs:
+    1. Insert a URLVisit record (unless store_row is False)
+    2. Upsert URLDailyStat for the visit day (Postgres ON CONFLICT)
+    3. Update URL.visit_count, URL.last_visited_at and the URL.unique_visitors rollup
+    
+    so the visit costs one round-trip instead of three.
     
     Args:
         session: Async database session
         url_id: The URL ID to track
         visited_at_dt: Timestamp of the visit
-        ip: Client IP address
+        ip: Client IP address; stored as NULL if it isn't a valid IP
+        store_row: Whether to keep a per-visit url_visits row
+        unique_visitors: Current PFCOUNT for the URL; the stored rollup
+            only ever grows, and None leaves it unchanged
     """
-    # 1. Insert visit record
-    visit = URLVisit(
-        url_id=url_id,
-        ip=ip,
-        visited_at=visited_at_dt
-    )
-    session.add(visit)
+    params = {
+        "url_id": url_id,
+        "visited_at": visited_at_dt,
+        "day": visited_at_dt.date(),
+        "unique_visitors": unique_visitors,
+    }
+    if store_row:
+        await session.execute(_RECORD_VISIT, {**params, "ip": _inet(ip)})
+    else:
+        await session.execute(_RECORD_VISIT_COUNTS, params)
+
+
+async def record_visits(
+    session: AsyncSession,
+    visits: list[tuple[int, str, datetime]],
+    store_rows: bool = True,
+    unique_visitors: Optional[dict[int, int]] = None
+) -> None:
+    """
+    Write a batch of visits using one statement per table.
     
-    visit_day = visited_at_dt.date()
-    stmt = insert(URLDailyStat).values(
-        url_id=url_id,
-        day=visit_day,
-        count=1
-    )
-    stmt = stmt.on_conflict_do_update(
-        index_elements=['url_id', 'day'],
-        set_={'count': URLDailyStat.count + 1}
-    )
-    await session.execute(stmt)
+    This function:
+    1. Inserts all URLVisit records in a single multi-row INSERT (unless store_rows is False)
+    2. Upserts URLDailyStat in one statement, adding the batch count per (url_id, day)
+    3. Updates URL.visit_count, URL.last_visited_at and the URL.unique_visitors
+       rollup in one statement for all url_ids
     
-    # Update URL totals
-    stmt = (
-        update(URL)
-        .where(URL.id == url_id)
-        .values(
-            visit_count=URL.visit_count + 1,
-            last_visited_at=visited_at_dt
-        )
-    )
-    await session.execute(stmt)
+    Args:
+        session: Async database session
+        visits: (url_id, ip, visited_at) tuples to record
+        store_rows: Whether to keep per-visit url_visits rows
+        unique_visitors: Current PFCOUNT per url_id; URLs missing from it
+            keep their stored rollup
+    """
+    unique_visitors = unique_visitors or {}
+    if not visits:
+        return
+    
+    if store_rows:
+        url_ids, ips, visited_ats = zip(*visits)
+        await session.execute(_BATCH_VISIT_INSERT, {
+            "url_ids": list(url_ids),
+            "ips": [_inet(ip) for ip in ips],
+            "visited_ats": list(visited_ats),
+        })
+    
+    daily_counts: Counter[tuple[int, date]] = Counter()
+    url_counts: Counter[int] = Counter()
+    last_visited: dict[int, datetime] = {}
+    for url_id, _, visited_at in visits:
+        daily_counts[(url_id, visited_at.date())] += 1
+        url_counts[url_id] += 1
+        if url_id not in last_visited or visited_at > last_visited[url_id]:
+            last_visited[url_id] = visited_at
+    
+    # Every tracker writes its rows in key order, so concurrent batches with
+    # overlapping URLs take row locks in the same order instead of deadlocking
+    daily_keys = sorted(daily_counts)
+    await session.execute(_BATCH_DAILY_UPSERT, {
+        "url_ids": [url_id for url_id, _ in daily_keys],
+        "days": [day for _, day in daily_keys],
+        "counts": [daily_counts[key] for key in daily_keys],
+    })
+    
+    url_ids = sorted(url_counts)
+    await session.execute(_BATCH_URL_COUNTERS_UPDATE, {
+        "url_ids": url_ids,
+        "counts": [url_counts[url_id] for url_id in url_ids],
+        "last_visited_ats": [last_visited[url_id] for url_id in url_ids],
+        "unique_visitors": [unique_visitors.get(url_id) for url_id in url_ids],
+    })
 
 
 async def get_stats(
     session: AsyncSession,
     short_code: str,
     days: Optional[int] = None
-) -> tuple[Optional[URL], list[URLDailyStat]]:
+) -> tuple[Optional[URL], list[tuple[date, int]]]:
     """
     Get URL statistics including optional daily breakdown.
     
@@ -116,28 +283,43 @@ async def get_stats(
         days: Optional number of days of daily stats to retrieve (most recent)
         
     Returns:
-        Tuple of (URL object, list of URLDailyStat objects)
+        Tuple of (URL object, list of (day, count) rows, most recent first)
         If URL not found, returns (None, [])
     """
-    # Get the URL
-    url = await get_by_code(session, short_code)
-    if not url:
-        return None, []
+    if days is None or days <= 0:
+        return await get_by_code(session, short_code), []
     
-    # Get daily stats if requested
-    daily_stats = []
-    if days is not None and days > 0:
-        today = datetime.now(timezone.utc).date()
-        start_day = today - timedelta(days=days - 1)
-        stmt = (
-            select(URLDailyStat)
-            .where(URLDailyStat.url_id == url.id)
-            .where(URLDailyStat.day >= start_day)
-            .where(URLDailyStat.day <= today)
-            .order_by(URLDailyStat.day.desc())
-            .limit(days)
+    # Fetch the URL and its recent daily rows in one round-trip: the daily
+    # rows are JSON-aggregated in a correlated subquery next to the URL row
+    today = datetime.now(timezone.utc).date()
+    start_day = today - timedelta(days=days - 1)
+    daily = (
+        select(
+            func.json_agg(
+                aggregate_order_by(
+                    func.json_build_object(
+                        'day', URLDailyStat.day,
+                        'count', URLDailyStat.count
+                    ),
+                    URLDailyStat.day.desc()
+                ),
+                type_=JSON
+            )
         )
-        result = await session.execute(stmt)
-        daily_stats = list(result.scalars().all())
+        .where(URLDailyStat.url_id == URL.id)
+        .where(URLDailyStat.day >= start_day)
+        .where(URLDailyStat.day <= today)
+        .scalar_subquery()
+    )
+    stmt = select(URL, daily).where(URL.short_code == short_code)
+    result = await session.execute(stmt)
+    row = result.first()
+    if not row:
+        return None, []
     
+    url, daily_json = row
+    daily_stats = [
+        (date.fromisoformat(stat['day']), stat['count'])
+        for stat in daily_json or []
+    ]
     return url, daily_stats
@@ -1,15 +1,19 @@
 from datetime import datetime, date
-from typing import Optional
+from typing import Annotated, Optional
 
-from pydantic import BaseModel, Field, AnyUrl, field_validator
+from pydantic import BaseModel, Field, AnyUrl, UrlConstraints, field_validator
+
+# original_url is INCLUDEd in the short_code index, and btree entries must
+# stay under ~2.7KB, so URLs are capped at the common 2048-char browser limit
+MAX_URL_LENGTH = 2048
 
 
 class ShortenRequest(BaseModel):
     """Request body for creating short URLs."""
     
-    original_url: AnyUrl = Field(
+    original_url: Annotated[AnyUrl, UrlConstraints(max_length=MAX_URL_LENGTH)] = Field(
         ...,
-        description="The original URL to be shortened",
+        description=f"The original URL to be shortened (max {MAX_URL_LENGTH} characters)",
         examples=["https://example.com/very-long-url"]
     )
     custom_code: Optional[str] = Field(
@@ -113,6 +117,11 @@ class StatsResponse(BaseModel):
         None,
         description="Timestamp of the most recent visit"
     )
+    unique_visitors: Optional[int] = Field(
+        None,
+        ge=0,
+        description="Approximate number of distinct visitor IPs (counted in Redis, persisted with visit counters)"
+    )
     daily: Optional[list[DailyStat]] = Field(
         None,
         description="Daily visit statistics (last N days if requested)"
@@ -126,6 +135,7 @@ class StatsResponse(BaseModel):
                 "created_at": "2025-12-26T10:30:00Z",
                 "visit_count": 150,
                 "last_visited_at": "2025-12-26T15:45:00Z",
+                "unique_visitors": 97,
                 "daily": [
                     {"day": "2025-12-26", "count": 42},
                     {"day": "2025-12-25", "count": 38}
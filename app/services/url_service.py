@@ -1,14 +1,28 @@
+import logging
 import secrets
 import string
 from datetime import datetime, timezone
-from typing import Optional
+from typing import NamedTuple, Optional
 
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.exc import IntegrityError
 
-from app.db.models import URL
+from app.core.setting import settings
 from app.repositories import url_repo
 from app.schemas.url import StatsResponse, DailyStat
+from app.services.visit_tracker import (
+    Visit,
+    VisitTracker,
+    add_unique_visitors,
+    count_unique_visitors,
+)
+
+logger = logging.getLogger("url_shortener.cache")
+
+_ALPHABET = string.ascii_letters + string.digits
+# Largest multiple of len(_ALPHABET) that fits in a byte (62 * 4 = 248)
+_BYTE_LIMIT = 256 - 256 % len(_ALPHABET)
 
 
 class URLNotFound(Exception):
@@ -30,12 +44,21 @@ class InvalidCustomCode(Exception):
         super().__init__(message)
 
 
+class RedirectTarget(NamedTuple):
+    """The minimum needed to issue a redirect and track it."""
+
+    id: int
+    original_url: str
+
+
 def generate_code(length: int = 6) -> str:
     """
     Generate a random short code.
     
-    Uses alphanumeric characters (a-z, A-Z, 0-9) for the code.
-    This is a simple implementation; in production, consider:
+    Uses alphanumeric characters (a-z, A-Z, 0-9) for the code, mapped from
+    a single secrets.token_bytes() call instead of one RNG call per character.
+    Bytes at or above _BYTE_LIMIT are skipped so every character stays
+    equally likely. This is a simple implementation; in production, consider:
     - Base62 encoding of sequential IDs
     - Collision detection and retry logic
     - Configurable character sets
@@ -46,8 +69,14 @@ def generate_code(length: int = 6) -> str:
     Returns:
         A random alphanumeric string
     """
-    alphabet = string.ascii_letters + string.digits
-    return ''.join(secrets.choice(alphabet) for _ in range(length))
+    code = ''
+    while len(code) < length:
+        code += ''.join(
+            _ALPHABET[b % len(_ALPHABET)]
+            for b in secrets.token_bytes(length)
+            if b < _BYTE_LIMIT
+        )
+    return code[:length]
 
 
 async def shorten_url(
@@ -63,7 +92,7 @@ async def shorten_url(
         session: Async database session
         original_url: The URL to shorten
         custom_code: Optional custom short code
-        base_url: Base URL for constructing the short URL
+        base_url: Base URL for constructing the short URL, without a trailing slash
         
     Returns:
         Dictionary with URL details (short_code, short_url, original_url, created_at)
@@ -72,47 +101,32 @@ async def shorten_url(
         CodeAlreadyExists: If the custom code is already in use
         InvalidCustomCode: If the custom code is invalid
     """
-    # Determine the short code
+    # Determine the short code; the unique index on short_code is the only
+    # collision check, so a taken code costs one INSERT and no race window
     if custom_code:
         short_code = custom_code
-        # Check if code already exists
-        existing = await url_repo.get_by_code(session, short_code)
-        if existing:
+        url = await url_repo.try_create_url(session, original_url, short_code)
+        if url is None:
             raise CodeAlreadyExists(short_code)
-        
-        # Try to create with custom code
-        try:
-            url = await url_repo.create_url(session, original_url, short_code)
-            await session.commit()
-        except IntegrityError as e:
-            await session.rollback()
-            # Race condition: code was taken between check and insert
-            raise CodeAlreadyExists(short_code) from e
     else:
         # Generate a code and retry on collision
         max_attempts = 5
         url = None
         
-        for attempt in range(max_attempts):
+        for _ in range(max_attempts):
             short_code = generate_code()
-            try:
-                url = await url_repo.create_url(session, original_url, short_code)
-                await session.commit()
-                break  # Success!
-            except IntegrityError:
-                await session.rollback()
-                # Collision, try again with new code
-                if attempt == max_attempts - 1:
-                    # Last attempt failed, raise error
-                    raise CodeAlreadyExists(short_code)
-                # Continue to next attempt
+            url = await url_repo.try_create_url(session, original_url, short_code)
+            if url is not None:
+                break
         
         if url is None:
-            # Should not reach here, but safety check
+            # Every attempt collided
             raise CodeAlreadyExists(short_code)
     
+    await session.commit()
+    
     # Build response
-    short_url = f"{base_url.rstrip('/')}/{short_code}"
+    short_url = f"{base_url}/{short_code}"
     
     return {
         "short_code": url.short_code,
@@ -122,10 +136,61 @@ async def shorten_url(
     }
 
 
+def _url_cache_key(short_code: str) -> str:
+    return f"u:{short_code}"
+
+
+async def _resolve(
+    session: AsyncSession,
+    short_code: str,
+    redis: Optional[Redis]
+) -> RedirectTarget:
+    """
+    Read-through lookup of a short code.
+    
+    Checks Redis first and falls back to the database on a miss, caching
+    the result for URL_CACHE_TTL seconds. Redis errors are logged and
+    treated as a miss so the cache never takes redirects down.
+    
+    Raises:
+        URLNotFound: If the short code doesn't exist
+    """
+    key = _url_cache_key(short_code)
+    
+    if redis is not None:
+        try:
+            cached = await redis.get(key)
+        except RedisError as e:
+            logger.warning(f"Redis GET failed for {key}: {e}")
+            cached = None
+        if cached:
+            url_id, original_url = cached.split(":", 1)
+            return RedirectTarget(id=int(url_id), original_url=original_url)
+    
+    row = await url_repo.get_redirect_target(session, short_code)
+    if not row:
+        raise URLNotFound(short_code)
+    
+    target = RedirectTarget(*row)
+    
+    if redis is not None:
+        try:
+            await redis.set(
+                key,
+                f"{target.id}:{target.original_url}",
+                ex=settings.URL_CACHE_TTL
+            )
+        except RedisError as e:
+            logger.warning(f"Redis SET failed for {key}: {e}")
+    
+    return target
+
+
 async def resolve_only(
     session: AsyncSession,
-    short_code: str
-) -> URL:
+    short_code: str,
+    redis: Optional[Redis] = None
+) -> RedirectTarget:
     """
     Resolve a short code to its URL WITHOUT tracking the visit.
     
@@ -135,63 +200,88 @@ async def resolve_only(
     Args:
         session: Async database session
         short_code: The short code to resolve
+        redis: Optional Redis client used as a read-through cache
         
     Returns:
-        The URL object
+        The redirect target (URL id and original URL)
         
     Raises:
         URLNotFound: If the short code doesn't exist
     """
-    url = await url_repo.get_by_code(session, short_code)
-    if not url:
-        raise URLNotFound(short_code)
-    
-    return url
+    return await _resolve(session, short_code, redis)
 
 
 async def resolve_and_track(
     session: AsyncSession,
     short_code: str,
-    client_ip: str
-) -> URL:
+    client_ip: str,
+    redis: Optional[Redis] = None,
+    tracker: Optional[VisitTracker] = None
+) -> RedirectTarget:
     """
     Resolve a short code to its URL and track the visit.
     
+    When a running tracker is given the visit is queued and written in
+    the background; otherwise (or if its queue is full) it is written
+    before returning.
+    
     Args:
         session: Async database session
         short_code: The short code to resolve
         client_ip: Client IP address for tracking
+        redis: Optional Redis client used as a read-through cache
+        tracker: Optional background visit tracker
         
     Returns:
-        The URL object
+        The redirect target (URL id and original URL)
         
     Raises:
         URLNotFound: If the short code doesn't exist
     """
-    # Get the URL
-    url = await url_repo.get_by_code(session, short_code)
-    if not url:
-        raise URLNotFound(short_code)
+    target = await _resolve(session, short_code, redis)
+    
+    visit = Visit(target.id, client_ip, datetime.now(timezone.utc))
+    if tracker is not None and tracker.track(visit):
+        return target
     
-    visited_at = datetime.now(timezone.utc)
-    await url_repo.increment_counters(session, url.id, visited_at, client_ip)
+    unique_visitors = {}
+    if redis is not None:
+        unique_visitors = await add_unique_visitors(redis, [visit])
+    await url_repo.increment_counters(
+        session,
+        visit.url_id,
+        visit.visited_at,
+        visit.ip,
+        store_row=settings.VISIT_ROWS_ENABLED,
+        unique_visitors=unique_visitors.get(visit.url_id)
+    )
     await session.commit()
     
-    return url
+    return target
+
+
+def _stats_cache_key(short_code: str, days: Optional[int]) -> str:
+    return f"s:{short_code}:{days or 0}"
 
 
 async def fetch_stats(
     session: AsyncSession,
     short_code: str,
-    days: Optional[int] = None
+    days: Optional[int] = None,
+    redis: Optional[Redis] = None
 ) -> StatsResponse:
     """
     Fetch statistics for a short URL.
     
+    Responses are cached in Redis for STATS_CACHE_TTL seconds per
+    (short_code, days). Counters change on every visit, so entries are
+    left to expire rather than invalidated; stats may lag by up to the TTL.
+    
     Args:
         session: Async database session
         short_code: The short code to get stats for
         days: Optional number of days of daily stats to include
+        redis: Optional Redis client used to cache the response
         
     Returns:
         StatsResponse object with URL statistics
@@ -199,6 +289,17 @@ async def fetch_stats(
     Raises:
         URLNotFound: If the short code doesn't exist
     """
+    key = _stats_cache_key(short_code, days)
+    
+    if redis is not None:
+        try:
+            cached = await redis.get(key)
+        except RedisError as e:
+            logger.warning(f"Redis GET failed for {key}: {e}")
+            cached = None
+        if cached:
+            return StatsResponse.model_validate_json(cached)
+    
     url, daily_stats = await url_repo.get_stats(session, short_code, days)
     
     if not url:
@@ -208,15 +309,29 @@ async def fetch_stats(
     daily = None
     if daily_stats:
         daily = [
-            DailyStat(day=stat.day, count=stat.count)
-            for stat in reversed(daily_stats)
+            DailyStat(day=day, count=count)
+            for day, count in reversed(daily_stats)
         ]
     
-    return StatsResponse(
+    stats = StatsResponse(
         short_code=url.short_code,
         original_url=url.original_url,
         created_at=url.created_at,
         visit_count=url.visit_count,
         last_visited_at=url.last_visited_at,
+        unique_visitors=url.unique_visitors,
         daily=daily
     )
+    
+    if redis is not None:
+        # The stored rollup is a floor: it outlives the HyperLogLog if Redis
+        # loses the key, and the live count is ahead of it between writes
+        live = await count_unique_visitors(redis, url.id)
+        if live is not None:
+            stats.unique_visitors = max(live, url.unique_visitors or 0)
+        try:
+            await redis.set(key, stats.model_dump_json(), ex=settings.STATS_CACHE_TTL)
+        except RedisError as e:
+            logger.warning(f"Redis SET failed for {key}: {e}")
+    
+    return stats
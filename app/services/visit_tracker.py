@@ -0,0 +1,260 @@
+import asyncio
+import logging
+from contextlib import AbstractAsyncContextManager
+from datetime import datetime
+from typing import Callable, NamedTuple, Optional
+
+from fastapi import Request
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.repositories import url_repo
+
+logger = logging.getLogger("url_shortener.visits")
+
+# A failed batch is rolled back, so it is safe to write again
+_WRITE_ATTEMPTS = 3
+# deadlock_detected, serialization_failure
+_RETRYABLE_SQLSTATES = {"40P01", "40001"}
+
+
+class Visit(NamedTuple):
+    """A single redirect waiting to be written."""
+
+    url_id: int
+    ip: str
+    visited_at: datetime
+
+
+def _unique_visitors_key(url_id: int) -> str:
+    return f"uniq:{url_id}"
+
+
+async def add_unique_visitors(redis: Redis, visits: list[Visit]) -> dict[int, int]:
+    """
+    Add visitor IPs to each URL's HyperLogLog in one pipelined round-trip.
+    
+    Each key is a fixed ~12KB regardless of traffic, so unique visitors
+    are counted without keeping a row per visit. The same round-trip reads
+    back PFCOUNT for every URL in the batch so the caller can persist it
+    alongside the visit counters. Redis errors are logged and yield an
+    empty dict.
+    
+    Returns:
+        Approximate unique visitors per url_id after adding the batch
+    """
+    url_ids = list(dict.fromkeys(visit.url_id for visit in visits))
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for visit in visits:
+                pipe.pfadd(_unique_visitors_key(visit.url_id), visit.ip)
+            for url_id in url_ids:
+                pipe.pfcount(_unique_visitors_key(url_id))
+            results = await pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Redis PFADD failed for {len(visits)} visits: {e}")
+        return {}
+    return dict(zip(url_ids, results[len(visits):]))
+
+
+async def count_unique_visitors(redis: Redis, url_id: int) -> Optional[int]:
+    """Approximate distinct visitor IPs for a URL (~0.8% standard error)."""
+    try:
+        return await redis.pfcount(_unique_visitors_key(url_id))
+    except RedisError as e:
+        logger.warning(f"Redis PFCOUNT failed for url {url_id}: {e}")
+        return None
+
+
+class VisitTracker:
+    """
+    Buffers visits in an in-process queue and writes them in batches.
+
+    The redirect path only does a non-blocking put; a background task
+    drains the queue every flush_interval seconds (or as soon as
+    batch_size visits are waiting) and writes the batch in one transaction.
+    With a Redis client, visitor IPs also go to per-URL HyperLogLogs, and
+    store_rows=False drops the per-visit url_visits rows entirely.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AbstractAsyncContextManager[AsyncSession]],
+        batch_size: int = 500,
+        flush_interval: float = 0.05,
+        max_queue_size: int = 10000,
+        redis: Optional[Redis] = None,
+        store_rows: bool = True
+    ):
+        self._session_factory = session_factory
+        self._redis = redis
+        self._store_rows = store_rows
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._queue: asyncio.Queue[Visit] = asyncio.Queue(maxsize=max_queue_size)
+        self._queued = asyncio.Event()
+        self._pending: list[Visit] = []
+        self._task: Optional[asyncio.Task] = None
+        # Batch writes run in their own tasks, one at a time
+        self._writes: set[asyncio.Task] = set()
+        self._write_lock = asyncio.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start the background flusher."""
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flusher and write whatever is still queued."""
+        if self._task is not None:
+            # Cancelling only interrupts collection: a batch being written
+            # keeps going in its own task and is waited for below
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._wait_for_writes()
+
+        # A batch interrupted mid-collection is still pending
+        batch, self._pending = self._pending, []
+        await self._write(batch)
+        while not self._queue.empty():
+            await self._write(self._drain(self._batch_size))
+
+    async def flush(self) -> None:
+        """
+        Write every visit tracked so far without stopping the flusher.
+
+        Waits for a batch already being written, then writes what the
+        flusher was collecting and everything still queued.
+        """
+        await self._wait_for_writes()
+        batch, self._pending = self._pending, []
+        batch.extend(self._drain(self._queue.qsize()))
+        for start in range(0, len(batch), self._batch_size):
+            await self._write(batch[start:start + self._batch_size])
+        # The flusher may have started another batch meanwhile
+        await self._wait_for_writes()
+
+    def track(self, visit: Visit) -> bool:
+        """
+        Queue a visit without waiting.
+
+        Returns:
+            False if the tracker is not running or the queue is full, in
+            which case the caller should record the visit itself.
+        """
+        if not self.running:
+            return False
+        try:
+            self._queue.put_nowait(visit)
+        except asyncio.QueueFull:
+            return False
+        self._queued.set()
+        return True
+
+    def _drain(self, limit: int) -> list[Visit]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wait_for_visits()
+            deadline = loop.time() + self._flush_interval
+            while True:
+                # Visits move from the queue to _pending without an await in
+                # between, so flush() and stop() always find each one in
+                # the queue, in _pending, or in a write task
+                self._pending.extend(self._drain(self._batch_size - len(self._pending)))
+                timeout = deadline - loop.time()
+                if len(self._pending) >= self._batch_size or timeout <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._wait_for_visits(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            batch, self._pending = self._pending, []
+            await self._write(batch)
+
+    async def _wait_for_visits(self) -> None:
+        while self._queue.empty():
+            self._queued.clear()
+            await self._queued.wait()
+
+    async def _write(self, batch: list[Visit]) -> None:
+        """
+        Write a batch in a separate, shielded task.
+
+        Cancelling the caller can't interrupt the write (e.g. after its
+        COMMIT reached the server), so a batch is never written twice: it
+        has already left _pending and stop() waits for the task instead.
+        """
+        if not batch:
+            return
+        task = asyncio.create_task(self._locked_flush(batch))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+        await asyncio.shield(task)
+
+    async def _wait_for_writes(self) -> None:
+        if self._writes:
+            await asyncio.shield(asyncio.gather(*self._writes))
+
+    async def _locked_flush(self, batch: list[Visit]) -> None:
+        async with self._write_lock:
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[Visit]) -> None:
+        if not batch:
+            return
+        unique_visitors = None
+        if self._redis is not None:
+            unique_visitors = await add_unique_visitors(self._redis, batch)
+        for attempt in range(1, _WRITE_ATTEMPTS + 1):
+            try:
+                async with self._session_factory() as session:
+                    await url_repo.record_visits(
+                        session, batch, store_rows=self._store_rows, unique_visitors=unique_visitors
+                    )
+                    await session.commit()
+                return
+            except Exception as e:
+                if attempt == _WRITE_ATTEMPTS or not _is_retryable(e):
+                    logger.exception(f"Failed to write {len(batch)} queued visits")
+                    return
+                logger.warning(f"Retrying {len(batch)} queued visits (attempt {attempt} failed): {e}")
+
+
+def _is_retryable(e: Exception) -> bool:
+    """
+    Whether a failed batch write should be tried again.
+
+    With pool pre-ping off, a stale pooled connection only shows up as a
+    disconnect on first use. SQLAlchemy then invalidates the pool, so the
+    retry checks out a fresh connection. Deadlocks and serialization
+    failures roll the transaction back and succeed when tried again. A
+    disconnect during COMMIT is ambiguous: the batch may already be in,
+    and retrying can count it twice. That is rarer than losing the batch.
+    """
+    if isinstance(e, DBAPIError):
+        return e.connection_invalidated or getattr(e.orig, "sqlstate", None) in _RETRYABLE_SQLSTATES
+    return isinstance(e, OSError)
+
+
+async def get_visit_tracker(request: Request) -> Optional[VisitTracker]:
+    """FastAPI dependency returning the app's tracker, if one was started."""
+    return getattr(request.app.state, "visit_tracker", None)
@@ -0,0 +1,70 @@
+"""covering short code index
+
+Revision ID: 4778acc2e73c
+Revises: 85690954ef3c
+Create Date: 2026-10-14 03:35:22.457799
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = '4778acc2e73c'
+down_revision = '85690954ef3c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # urls is written on every visit and every /shorten, so build and drop
+    # CONCURRENTLY instead of holding a SHARE lock for the whole build;
+    # CONCURRENTLY can't run inside the migration transaction. The new index
+    # is built before the old one is dropped so short_code stays unique
+    # throughout.
+    #
+    # original_url is stored in the index, whose entries must fit in ~2.7KB.
+    # Only new URLs are capped at 2048 characters: an existing row with a
+    # longer, incompressible original_url makes the build fail. A failed
+    # CONCURRENTLY build leaves an INVALID index behind, which is dropped
+    # here first when the migration is retried.
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_urls_short_code_covering',
+            table_name='urls',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.create_index(
+            'ix_urls_short_code_covering',
+            'urls',
+            ['short_code'],
+            unique=True,
+            postgresql_include=['id', 'original_url'],
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            op.f('ix_urls_short_code'),
+            table_name='urls',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            op.f('ix_urls_short_code'),
+            'urls',
+            ['short_code'],
+            unique=True,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            'ix_urls_short_code_covering',
+            table_name='urls',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
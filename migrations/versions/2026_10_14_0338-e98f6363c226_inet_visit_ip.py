@@ -0,0 +1,59 @@
+"""inet visit ip
+
+Revision ID: e98f6363c226
+Revises: 4778acc2e73c
+Create Date: 2026-10-14 03:38:47.771184
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e98f6363c226'
+down_revision = '4778acc2e73c'
+branch_labels = None
+depends_on = None
+
+
+# Same rule as app.repositories.url_repo._inet: a bare IPv4/IPv6 address
+# becomes inet, anything else (e.g. "unknown", a spoofed X-Forwarded-For,
+# a CIDR) becomes NULL instead of aborting the cast
+_CREATE_TRY_INET = """
+CREATE FUNCTION url_shortener_try_inet(value text) RETURNS inet
+LANGUAGE plpgsql IMMUTABLE AS $$
+BEGIN
+    IF position('/' in value) > 0 THEN
+        RETURN NULL;
+    END IF;
+    RETURN value::inet;
+EXCEPTION WHEN invalid_text_representation THEN
+    RETURN NULL;
+END
+$$
+"""
+
+
+def upgrade() -> None:
+    op.execute(_CREATE_TRY_INET)
+    # DROP NOT NULL must come first: the cast produces NULLs. Alembic's
+    # alter_column emits the type change before the nullability change.
+    op.execute(
+        "ALTER TABLE url_visits "
+        "ALTER COLUMN ip DROP NOT NULL, "
+        "ALTER COLUMN ip TYPE inet USING url_shortener_try_inet(ip)"
+    )
+    op.execute("DROP FUNCTION url_shortener_try_inet(text)")
+
+
+def downgrade() -> None:
+    op.alter_column(
+        'url_visits',
+        'ip',
+        existing_type=postgresql.INET(),
+        type_=sa.String(length=45),
+        nullable=False,
+        postgresql_using="COALESCE(host(ip), 'unknown')",
+    )
@@ -0,0 +1,92 @@
+"""partition url visits
+
+Revision ID: 611a835cbef8
+Revises: e98f6363c226
+Create Date: 2026-10-14 03:40:21.946491
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '611a835cbef8'
+down_revision = 'e98f6363c226'
+branch_labels = None
+depends_on = None
+
+
+# Existing rows get one partition per month they span, plus the next two months
+_CREATE_MONTHLY_PARTITIONS = """
+DO $$
+DECLARE
+    month date;
+BEGIN
+    FOR month IN
+        SELECT generate_series(
+            date_trunc('month', coalesce(min(visited_at), now()) AT TIME ZONE 'UTC'),
+            date_trunc('month', now() AT TIME ZONE 'UTC') + interval '2 months',
+            interval '1 month'
+        )::date
+        FROM url_visits_legacy
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF url_visits FOR VALUES FROM (%L) TO (%L)',
+            'url_visits_' || to_char(month, 'YYYY_MM'),
+            month::text || ' 00:00+00',
+            (month + interval '1 month')::date::text || ' 00:00+00'
+        );
+    END LOOP;
+END
+$$
+"""
+
+
+def _rename_out(table: str) -> None:
+    """Move url_visits aside, keeping its id sequence for the new table."""
+    op.rename_table('url_visits', table)
+    op.execute(f"ALTER INDEX url_visits_pkey RENAME TO {table}_pkey")
+    op.drop_index('ix_url_visits_url_id_visited_at', table_name=table)
+    op.execute("ALTER SEQUENCE url_visits_id_seq OWNED BY NONE")
+
+
+def _create_url_visits(primary_key: list[str], **kw) -> None:
+    op.create_table(
+        'url_visits',
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('url_visits_id_seq')"), nullable=False),
+        sa.Column('url_id', sa.Integer(), nullable=False),
+        sa.Column('ip', postgresql.INET(), nullable=True),
+        sa.Column('visited_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['url_id'], ['urls.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint(*primary_key),
+        **kw,
+    )
+    op.execute("ALTER SEQUENCE url_visits_id_seq OWNED BY url_visits.id")
+
+
+def _copy_in(table: str) -> None:
+    op.execute(
+        f"INSERT INTO url_visits (id, url_id, ip, visited_at) "
+        f"SELECT id, url_id, ip, visited_at FROM {table}"
+    )
+    op.drop_table(table)
+    op.create_index('ix_url_visits_url_id_visited_at', 'url_visits', ['url_id', 'visited_at'], unique=False)
+
+
+def upgrade() -> None:
+    # Postgres can't partition an existing table, so rebuild it. This copies
+    # every visit row; run it in a maintenance window on large tables.
+    _rename_out('url_visits_legacy')
+    _create_url_visits(['id', 'visited_at'], postgresql_partition_by='RANGE (visited_at)')
+    op.execute(_CREATE_MONTHLY_PARTITIONS)
+    op.execute("CREATE TABLE url_visits_default PARTITION OF url_visits DEFAULT")
+    _copy_in('url_visits_legacy')
+
+
+def downgrade() -> None:
+    _rename_out('url_visits_partitioned')
+    _create_url_visits(['id'])
+    # Dropping the partitioned parent drops its partitions too
+    _copy_in('url_visits_partitioned')
@@ -0,0 +1,42 @@
+"""drop duplicate daily stats index
+
+Revision ID: 1e2af05bfcc6
+Revises: 611a835cbef8
+Create Date: 2026-10-14 03:46:50.249825
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = '1e2af05bfcc6'
+down_revision = '611a835cbef8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # uq_url_daily_stats_url_id_day's index already serves (url_id, day)
+    # lookups and is scanned backward for day DESC; this one only costs
+    # writes. CONCURRENTLY can't run inside the migration transaction.
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_url_daily_stats_url_id_day',
+            table_name='url_daily_stats',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_url_daily_stats_url_id_day',
+            'url_daily_stats',
+            ['url_id', 'day'],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
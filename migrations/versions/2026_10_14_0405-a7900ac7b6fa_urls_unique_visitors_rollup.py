@@ -0,0 +1,27 @@
+"""urls unique visitors rollup
+
+Revision ID: a7900ac7b6fa
+Revises: 1e2af05bfcc6
+Create Date: 2026-10-14 04:05:12.869054
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7900ac7b6fa'
+down_revision = '1e2af05bfcc6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Persisted PFCOUNT of uniq:<url_id>. Nullable with no default, so adding
+    # it is a catalog-only change and doesn't rewrite urls.
+    op.add_column('urls', sa.Column('unique_visitors', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('urls', 'unique_visitors')
@@ -0,0 +1,124 @@
+"""
+Test engine and session factory, created once per process at import.
+
+Fixtures in conftest.py only wrap these: the session-scoped engine fixture
+builds the schema on ENGINE and disposes it, and each test binds
+SESSION_MAKER to its own rolled-back connection.
+"""
+import functools
+import os
+from urllib.parse import urlparse, urlunparse
+
+from sqlalchemy import make_url, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.core.setting import settings
+
+
+@functools.cache
+def build_test_database_url() -> str:
+    """Build test database URL from environment variables.
+    
+    Priority:
+    1. TEST_PG_DSN - full test database DSN
+    2. PG_DSN with database name replaced to test database
+    3. Individual TEST_PG_* or PG_* environment variables
+    4. Default localhost connection
+    
+    Under pytest-xdist each worker gets its own database, suffixed with the
+    worker id (shorakka_test_gw0, shorakka_test_gw1, ...).
+    """
+    dsn = _base_test_database_url()
+    if worker := os.getenv("PYTEST_XDIST_WORKER"):
+        parsed = urlparse(dsn)
+        dsn = urlunparse(parsed._replace(path=f"{parsed.path}_{worker}"))
+    return dsn
+
+
+def _base_test_database_url() -> str:
+    # Option 1: Direct test DSN
+    if dsn := os.getenv("TEST_PG_DSN"):
+        return dsn
+    
+    # Option 2: Use main PG_DSN and replace database name
+    if main_dsn := os.getenv("PG_DSN"):
+        parsed = urlparse(main_dsn)
+        test_db = os.getenv("TEST_PG_DB", "shorakka_test")
+        # Replace the database name in the path
+        test_dsn = urlunparse(parsed._replace(path=f"/{test_db}"))
+        return test_dsn
+    
+    # Option 3: Build from individual components
+    user = os.getenv("TEST_PG_USER", os.getenv("PG_USER", "postgres"))
+    password = os.getenv("TEST_PG_PASSWORD", os.getenv("PG_PASSWORD", "postgres"))
+    host = os.getenv("TEST_PG_HOST", os.getenv("PG_HOST", "localhost"))
+    port = os.getenv("TEST_PG_PORT", os.getenv("PG_PORT", "5432"))
+    db = os.getenv("TEST_PG_DB", "shorakka_test")
+    
+    return f"postgresql+asyncpg://{user}:{password}@{host}:{port}/{db}"
+
+
+TEST_DATABASE_URL = build_test_database_url()
+
+
+async def create_test_database(url: str) -> None:
+    """Create the test database if it doesn't exist (Postgres has no CREATE DATABASE IF NOT EXISTS)."""
+    url = make_url(url)
+    admin_engine = create_async_engine(
+        url.set(database="postgres"),
+        isolation_level="AUTOCOMMIT",
+        poolclass=NullPool,
+    )
+    try:
+        async with admin_engine.connect() as conn:
+            exists = await conn.scalar(
+                text("SELECT 1 FROM pg_database WHERE datname = :name"),
+                {"name": url.database},
+            )
+            if not exists:
+                await conn.execute(text(f'CREATE DATABASE "{url.database}"'))
+    finally:
+        await admin_engine.dispose()
+
+
+async def drop_test_database(url: str) -> None:
+    """Drop a test database, disconnecting anything still attached to it."""
+    url = make_url(url)
+    admin_engine = create_async_engine(
+        url.set(database="postgres"),
+        isolation_level="AUTOCOMMIT",
+        poolclass=NullPool,
+    )
+    try:
+        async with admin_engine.connect() as conn:
+            await conn.execute(text(f'DROP DATABASE IF EXISTS "{url.database}" WITH (FORCE)'))
+    finally:
+        await admin_engine.dispose()
+
+
+ENGINE = create_async_engine(
+    TEST_DATABASE_URL,
+    echo=False,
+    # Connections are reused by every test in the run; one is checked
+    # out at a time, so a small pool without pre-ping is enough
+    pool_size=5,
+    max_overflow=0,
+    pool_pre_ping=False,
+    connect_args={
+        "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "server_settings": {
+            "timezone": "UTC",
+            "statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS),
+        },
+    },
+)
+
+# Unbound: each test passes bind=<its connection>. Sessions join that
+# connection's outer transaction through a SAVEPOINT, so session.commit()
+# (in tests and in the app code under test) never commits for real.
+SESSION_MAKER = async_sessionmaker(
+    expire_on_commit=False,
+    autoflush=False,
+    join_transaction_mode="create_savepoint",
+)
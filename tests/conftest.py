@@ -1,7 +1,5 @@
-import os
 from pathlib import Path
 from typing import AsyncGenerator
-from urllib.parse import urlparse, urlunparse
 
 # Load .env file FIRST before any other imports that might use env vars
 from dotenv import load_dotenv
@@ -11,113 +9,151 @@ import pytest
 import pytest_asyncio
 from httpx import AsyncClient, ASGITransport
 from sqlalchemy import text
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
-from sqlmodel.ext.asyncio.session import AsyncSession
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
 
-
-def build_test_database_url() -> str:
-    """Build test database URL from environment variables.
-    
-    Priority:
-    1. TEST_PG_DSN - full test database DSN
-    2. PG_DSN with database name replaced to test database
-    3. Individual TEST_PG_* or PG_* environment variables
-    4. Default localhost connection
-    """
-    # Option 1: Direct test DSN
-    if dsn := os.getenv("TEST_PG_DSN"):
-        return dsn
-    
-    # Option 2: Use main PG_DSN and replace database name
-    if main_dsn := os.getenv("PG_DSN"):
-        parsed = urlparse(main_dsn)
-        test_db = os.getenv("TEST_PG_DB", "shorakka_test")
-        # Replace the database name in the path
-        test_dsn = urlunparse(parsed._replace(path=f"/{test_db}"))
-        return test_dsn
-    
-    # Option 3: Build from individual components
-    user = os.getenv("TEST_PG_USER", os.getenv("PG_USER", "postgres"))
-    password = os.getenv("TEST_PG_PASSWORD", os.getenv("PG_PASSWORD", "postgres"))
-    host = os.getenv("TEST_PG_HOST", os.getenv("PG_HOST", "localhost"))
-    port = os.getenv("TEST_PG_PORT", os.getenv("PG_PORT", "5432"))
-    db = os.getenv("TEST_PG_DB", "shorakka_test")
-    
-    return f"postgresql+asyncpg://{user}:{password}@{host}:{port}/{db}"
-
-
-TEST_DATABASE_URL = build_test_database_url()
-os.environ.setdefault("PG_DSN", TEST_DATABASE_URL)
+from tests._engine import ENGINE, SESSION_MAKER, TEST_DATABASE_URL, create_test_database
 
 from app.main import app
+from app.core.setting import settings
+from app.db.redis import get_redis
 from app.db.session import get_session
 from app.db.models import URL, URLVisit, URLDailyStat
 
 
-@pytest_asyncio.fixture(scope="function")
+@pytest.fixture(scope="session", autouse=True)
+def test_settings():
+    """Point the app's own engine at the test database for this session only."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(settings, "PG_DSN", TEST_DATABASE_URL)
+        yield settings
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
 async def test_engine() -> AsyncGenerator[AsyncEngine, None]:
-    """Create test DB engine."""
-    engine = create_async_engine(
-        TEST_DATABASE_URL,
-        echo=False,
-        pool_pre_ping=True,
-        poolclass=None,
-    )
-    
-    async with engine.begin() as conn:
+    """Create the schema on the shared test engine, once for the whole run."""
+    await create_test_database(TEST_DATABASE_URL)
+    
+    async with ENGINE.begin() as conn:
         from app.db.models import SQLModel
         await conn.run_sync(SQLModel.metadata.create_all)
+        # create_all keeps tables left behind by a run that died before
+        # drop_all; clear them in one statement
+        await conn.execute(text("TRUNCATE url_visits, url_daily_stats, urls RESTART IDENTITY CASCADE"))
     
-    yield engine
+    yield ENGINE
     
-    async with engine.begin() as conn:
+    async with ENGINE.begin() as conn:
         from app.db.models import SQLModel
         await conn.run_sync(SQLModel.metadata.drop_all)
     
-    await engine.dispose()
+    # Dispose here rather than atexit: pooled asyncpg connections belong to
+    # the session event loop, which is gone by interpreter exit
+    await ENGINE.dispose()
 
 
 @pytest_asyncio.fixture
-async def db_session(test_engine: AsyncEngine) -> AsyncGenerator[AsyncSession, None]:
-    """Get a test DB session."""
-    async_session_maker = sessionmaker(
-        bind=test_engine,
-        class_=AsyncSession,
-        expire_on_commit=False,
-        autocommit=False,
-        autoflush=False,
-    )
-    
-    async with async_session_maker() as session:
-        await cleanup_tables(session)
+async def db_connection(test_engine: AsyncEngine) -> AsyncGenerator[AsyncConnection, None]:
+    """
+    Connection holding an outer transaction that is rolled back after the test.
+    
+    Nothing a test writes is ever committed, so no table cleanup is needed.
+    """
+    async with test_engine.connect() as conn:
+        trans = await conn.begin()
         
-        yield session
+        yield conn
         
-        await cleanup_tables(session)
-        await session.close()
+        await trans.rollback()
 
 
-async def cleanup_tables(session: AsyncSession) -> None:
-    """Clear all tables."""
-    await session.exec(text("TRUNCATE url_visits CASCADE"))
-    await session.exec(text("TRUNCATE url_daily_stats CASCADE"))
-    await session.exec(text("TRUNCATE urls CASCADE"))
-    await session.commit()
+@pytest_asyncio.fixture
+async def db_session(db_connection: AsyncConnection) -> AsyncGenerator[AsyncSession, None]:
+    """Get a test DB session, joined to the test's outer transaction."""
+    async with SESSION_MAKER(bind=db_connection) as session:
+        yield session
 
 
-@pytest_asyncio.fixture
-async def client(db_session: AsyncSession) -> AsyncGenerator[AsyncClient, None]:
-    """HTTP client with test session override."""
-    async def override_get_session() -> AsyncGenerator[AsyncSession, None]:
-        yield db_session
-    
-    app.dependency_overrides[get_session] = override_get_session
-    
+@pytest_asyncio.fixture(scope="session")
+async def http_client() -> AsyncGenerator[AsyncClient, None]:
+    """One HTTP client over the ASGI app, shared by every test."""
     async with AsyncClient(
         transport=ASGITransport(app=app),
         base_url="http://test"
     ) as ac:
         yield ac
+
+
+@pytest_asyncio.fixture
+async def client(
+    http_client: AsyncClient,
+    db_connection: AsyncConnection,
+    db_session: AsyncSession
+) -> AsyncGenerator[AsyncClient, None]:
+    """HTTP client with test session override (a fresh session per request, as in the app)."""
+    async def override_get_session() -> AsyncGenerator[AsyncSession, None]:
+        async with SESSION_MAKER(bind=db_connection) as session:
+            yield session
+    
+    app.dependency_overrides[get_session] = override_get_session
+    
+    yield http_client
     
     app.dependency_overrides.clear()
+
+
+class FakeRedis:
+    """In-memory stand-in for the subset of redis.asyncio.Redis the app uses."""
+    
+    def __init__(self):
+        self.store: dict[str, str] = {}
+        self.hll: dict[str, set[str]] = {}
+    
+    async def get(self, key: str):
+        return self.store.get(key)
+    
+    async def set(self, key: str, value: str, ex: int | None = None):
+        self.store[key] = value
+        return True
+    
+    async def pfadd(self, key: str, *values: str):
+        self.hll.setdefault(key, set()).update(values)
+        return 1
+    
+    async def pfcount(self, key: str):
+        return len(self.hll.get(key, ()))
+    
+    def pipeline(self, transaction: bool = True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """Queues calls and runs them against the FakeRedis on execute()."""
+    
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.calls = []
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        self.calls = []
+    
+    def pfadd(self, key: str, *values: str):
+        self.calls.append(self.redis.pfadd(key, *values))
+        return self
+    
+    def pfcount(self, key: str):
+        self.calls.append(self.redis.pfcount(key))
+        return self
+    
+    async def execute(self):
+        return [await call for call in self.calls]
+
+
+@pytest_asyncio.fixture
+async def fake_redis(client: AsyncClient) -> FakeRedis:
+    """Route the app's Redis dependency to an in-memory fake."""
+    redis = FakeRedis()
+    app.dependency_overrides[get_redis] = lambda: redis
+    return redis
@@ -3,9 +3,10 @@ from httpx import AsyncClient
 
 
 @pytest.mark.asyncio
-async def test_healthz_returns_ok(client: AsyncClient):
+async def test_healthz_returns_ok(http_client: AsyncClient):
     """Healthz should return 200."""
-    response = await client.get("/healthz")
+    # No dependencies, so no DB connection or overrides are needed
+    response = await http_client.get("/healthz")
     
     assert response.status_code == 200
     assert response.json() == {"status": "ok"}
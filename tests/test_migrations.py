@@ -0,0 +1,62 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import make_url, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.core.setting import settings
+from tests._engine import TEST_DATABASE_URL, create_test_database, drop_test_database
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+
+
+@pytest.fixture
+async def migration_db(monkeypatch):
+    """An empty scratch database that migrations/env.py is pointed at."""
+    url = make_url(TEST_DATABASE_URL)
+    url = url.set(database=f"{url.database}_migrations").render_as_string(hide_password=False)
+    await drop_test_database(url)
+    await create_test_database(url)
+    monkeypatch.setattr(settings, "PG_DSN", url)
+
+    # No ini file: env.py would otherwise run fileConfig and disable the app's loggers
+    config = Config()
+    config.set_main_option("script_location", str(MIGRATIONS_DIR))
+    engine = create_async_engine(url, poolclass=NullPool)
+
+    async def upgrade(revision: str) -> None:
+        # env.py calls asyncio.run, so it can't run on this loop
+        await asyncio.to_thread(command.upgrade, config, revision)
+
+    yield engine, upgrade
+
+    await engine.dispose()
+    await drop_test_database(url)
+
+
+@pytest.mark.asyncio
+async def test_inet_migration_nulls_invalid_addresses(migration_db):
+    """Existing non-address ip values should become NULL, not abort the upgrade."""
+    engine, upgrade = migration_db
+    await upgrade("4778acc2e73c")
+
+    values = ["10.0.0.1", "::1", "unknown", "cafe", "1.2.3", "10.0.0.0/8"]
+    async with engine.begin() as conn:
+        url_id = await conn.scalar(text(
+            "INSERT INTO urls (original_url, short_code) VALUES ('https://example.com', 'mig1') RETURNING id"
+        ))
+        for ip in values:
+            await conn.execute(
+                text("INSERT INTO url_visits (url_id, ip) VALUES (:url_id, :ip)"),
+                {"url_id": url_id, "ip": ip},
+            )
+
+    await upgrade("head")
+
+    async with engine.connect() as conn:
+        result = await conn.execute(text("SELECT host(ip) FROM url_visits ORDER BY id"))
+        assert result.scalars().all() == ["10.0.0.1", "::1", None, None, None, None]
@@ -1,5 +1,7 @@
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import select
+from app.db.models import URLVisit
 
 
 @pytest.mark.asyncio
@@ -100,3 +102,77 @@ async def test_get_redirect_multiple_visits(client: AsyncClient):
     
     assert stats_data["visit_count"] == 3
     assert stats_data["last_visited_at"] is not None
+
+
+@pytest.mark.asyncio
+async def test_get_redirect_populates_cache(client: AsyncClient, fake_redis):
+    """A cache miss should store the target in Redis."""
+    create_response = await client.post(
+        "/shorten",
+        json={"original_url": "https://example.com/cached"}
+    )
+    assert create_response.status_code == 201
+    short_code = create_response.json()["short_code"]
+    
+    redirect_response = await client.get(
+        f"/{short_code}",
+        follow_redirects=False
+    )
+    
+    assert redirect_response.status_code == 307
+    cached = fake_redis.store[f"u:{short_code}"]
+    assert cached.endswith(":https://example.com/cached")
+
+
+@pytest.mark.asyncio
+async def test_head_redirect_served_from_cache(client: AsyncClient, fake_redis):
+    """A cache hit should redirect without a DB row."""
+    fake_redis.store["u:cachedonly"] = "1:https://example.com/from-cache"
+    
+    head_response = await client.head(
+        "/cachedonly",
+        follow_redirects=False
+    )
+    
+    assert head_response.status_code == 307
+    assert head_response.headers["location"] == "https://example.com/from-cache"
+
+
+@pytest.mark.asyncio
+async def test_get_redirect_tracks_forwarded_ip(db_session, client: AsyncClient):
+    """X-Forwarded-For from a trusted proxy should be the tracked IP."""
+    create_response = await client.post(
+        "/shorten",
+        json={"original_url": "https://example.com/proxied"}
+    )
+    assert create_response.status_code == 201
+    short_code = create_response.json()["short_code"]
+    
+    redirect_response = await client.get(
+        f"/{short_code}",
+        headers={"X-Forwarded-For": "203.0.113.7"},
+        follow_redirects=False
+    )
+    assert redirect_response.status_code == 307
+    
+    result = await db_session.execute(select(URLVisit.ip))
+    assert [str(ip) for ip in result.scalars().all()] == ["203.0.113.7"]
+
+
+@pytest.mark.asyncio
+async def test_get_redirect_is_logged(client: AsyncClient, caplog):
+    """GET redirects should log the code and client IP; HEAD and other paths shouldn't."""
+    create_response = await client.post(
+        "/shorten",
+        json={"original_url": "https://example.com/logged"}
+    )
+    assert create_response.status_code == 201
+    short_code = create_response.json()["short_code"]
+    
+    with caplog.at_level("INFO", logger="url_shortener.redirect"):
+        await client.get(f"/{short_code}", follow_redirects=False)
+        await client.head(f"/{short_code}", follow_redirects=False)
+        await client.get(f"/stats/{short_code}")
+    
+    messages = [r.getMessage() for r in caplog.records if r.name == "url_shortener.redirect"]
+    assert messages == [f"{short_code} | 127.0.0.1"]
@@ -1,5 +1,9 @@
+import string
+
 import pytest
 from httpx import AsyncClient
+from app.core.setting import settings
+from app.services.url_service import generate_code
 
 
 @pytest.mark.asyncio
@@ -137,3 +141,39 @@ async def test_shorten_url_invalid_url_format(client: AsyncClient):
     )
     
     assert response.status_code == 422
+
+
+def test_generate_code_length_and_alphabet():
+    """Generated codes should be alphanumeric with the requested length."""
+    allowed = set(string.ascii_letters + string.digits)
+    for length in (1, 6, 20):
+        code = generate_code(length)
+        assert len(code) == length
+        assert set(code) <= allowed
+
+
+@pytest.mark.asyncio
+async def test_shorten_url_too_long(client: AsyncClient):
+    """URLs over the length limit should fail."""
+    response = await client.post(
+        "/shorten",
+        json={
+            "original_url": "https://example.com/" + "a" * 2048
+        }
+    )
+    
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_shorten_url_uses_public_base_url(client: AsyncClient, monkeypatch):
+    """Configured PUBLIC_BASE_URL should replace the request host."""
+    monkeypatch.setattr(settings, "PUBLIC_BASE_URL", "https://sho.rt")
+    response = await client.post(
+        "/shorten",
+        json={"original_url": "https://example.com/public"}
+    )
+    
+    assert response.status_code == 201
+    data = response.json()
+    assert data["short_url"] == f"https://sho.rt/{data['short_code']}"
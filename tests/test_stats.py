@@ -1,6 +1,7 @@
 import pytest
 from datetime import datetime, timedelta, timezone
 from httpx import AsyncClient
+from sqlalchemy import insert
 from app.db.models import URL, URLDailyStat
 
 
@@ -67,28 +68,16 @@ async def test_stats_with_days_includes_daily_ascending_order(client: AsyncClien
 @pytest.mark.asyncio
 async def test_stats_days_validation_too_low(client: AsyncClient):
     """days=0 should fail."""
-    create_response = await client.post(
-        "/shorten",
-        json={"original_url": "https://example.com/validation-test"}
-    )
-    assert create_response.status_code == 201
-    short_code = create_response.json()["short_code"]
-    
-    stats_response = await client.get(f"/stats/{short_code}?days=0")
+    # Query validation runs before the lookup, so no URL is needed
+    stats_response = await client.get("/stats/nonexistent123?days=0")
     assert stats_response.status_code == 422
 
 
 @pytest.mark.asyncio
 async def test_stats_days_validation_too_high(client: AsyncClient):
     """days=31 should fail."""
-    create_response = await client.post(
-        "/shorten",
-        json={"original_url": "https://example.com/validation-test2"}
-    )
-    assert create_response.status_code == 201
-    short_code = create_response.json()["short_code"]
-    
-    stats_response = await client.get(f"/stats/{short_code}?days=31")
+    # Query validation runs before the lookup, so no URL is needed
+    stats_response = await client.get("/stats/nonexistent123?days=31")
     assert stats_response.status_code == 422
 
 
@@ -122,25 +111,28 @@ async def test_stats_with_valid_days_range(client: AsyncClient):
 @pytest.mark.asyncio
 async def test_stats_days_filters_sparse_history(db_session, client: AsyncClient):
     """Should only return stats within the N days window."""
-    url = URL(original_url="https://example.com/sparse", short_code="sparse1")
-    db_session.add(url)
-    await db_session.flush()
-    await db_session.refresh(url)
-
     today = datetime.now(timezone.utc).date()
     old_day = today - timedelta(days=20)
     recent_day = today - timedelta(days=2)
 
-    db_session.add_all([
-        URLDailyStat(url_id=url.id, day=old_day, count=5),
-        URLDailyStat(url_id=url.id, day=recent_day, count=3),
-        URLDailyStat(url_id=url.id, day=today, count=2),
+    # Two round-trips: INSERT ... RETURNING, then one multi-row VALUES insert
+    result = await db_session.execute(
+        insert(URL).values(
+            original_url="https://example.com/sparse",
+            short_code="sparse1",
+            visit_count=10,
+            last_visited_at=datetime.now(timezone.utc),
+        ).returning(URL.id)
+    )
+    url_id = result.scalar_one()
+    await db_session.execute(insert(URLDailyStat), [
+        {"url_id": url_id, "day": old_day, "count": 5},
+        {"url_id": url_id, "day": recent_day, "count": 3},
+        {"url_id": url_id, "day": today, "count": 2},
     ])
-    url.visit_count = 10
-    url.last_visited_at = datetime.now(timezone.utc)
     await db_session.commit()
 
-    stats_response = await client.get(f"/stats/{url.short_code}?days=7")
+    stats_response = await client.get("/stats/sparse1?days=7")
     assert stats_response.status_code == 200
     stats = stats_response.json()
 
@@ -150,3 +142,33 @@ async def test_stats_days_filters_sparse_history(db_session, client: AsyncClient
     assert recent_day.isoformat() in returned_days
     assert today.isoformat() in returned_days
     assert returned_days == sorted(returned_days)
+
+
+@pytest.mark.asyncio
+async def test_stats_cached_per_days(client: AsyncClient, fake_redis):
+    """Stats should be cached separately for each days value."""
+    create_response = await client.post(
+        "/shorten",
+        json={"original_url": "https://example.com/stats-cache"}
+    )
+    assert create_response.status_code == 201
+    short_code = create_response.json()["short_code"]
+    
+    assert (await client.get(f"/stats/{short_code}")).status_code == 200
+    assert (await client.get(f"/stats/{short_code}?days=7")).status_code == 200
+    
+    assert f"s:{short_code}:0" in fake_redis.store
+    assert f"s:{short_code}:7" in fake_redis.store
+
+
+@pytest.mark.asyncio
+async def test_stats_served_from_cache(client: AsyncClient, fake_redis):
+    """A cached response should be returned without a DB row."""
+    fake_redis.store["s:cachedonly:0"] = (
+        '{"short_code": "cachedonly", "original_url": "https://example.com/c", '
+        '"created_at": "2025-12-26T10:30:00Z", "visit_count": 42}'
+    )
+    
+    stats_response = await client.get("/stats/cachedonly")
+    assert stats_response.status_code == 200
+    assert stats_response.json()["visit_count"] == 42
@@ -0,0 +1,328 @@
+import asyncio
+import pytest
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta, timezone
+from httpx import AsyncClient
+from sqlalchemy import select, text
+from sqlalchemy.exc import DBAPIError
+from app.db import partitions
+from app.main import app
+from app.db.models import URL, URLVisit, URLDailyStat
+from app.repositories import url_repo
+from app.services.visit_tracker import Visit, VisitTracker
+from tests._engine import SESSION_MAKER
+
+
+async def create_url(db_session, short_code: str) -> URL:
+    url = URL(original_url=f"https://example.com/{short_code}", short_code=short_code)
+    db_session.add(url)
+    await db_session.commit()
+    await db_session.refresh(url)
+    return url
+
+
+@pytest.mark.asyncio
+async def test_record_visits_aggregates_batch(db_session, client: AsyncClient):
+    """A batch should add per-URL and per-day counts."""
+    first = await create_url(db_session, "batch1")
+    second = await create_url(db_session, "batch2")
+
+    now = datetime.now(timezone.utc)
+    yesterday = now - timedelta(days=1)
+    await url_repo.record_visits(db_session, [
+        (first.id, "10.0.0.1", yesterday),
+        (first.id, "10.0.0.2", now),
+        (first.id, "10.0.0.3", now),
+        (second.id, "10.0.0.4", now),
+    ])
+    await db_session.commit()
+
+    stats_response = await client.get("/stats/batch1?days=2")
+    stats = stats_response.json()
+    assert stats["visit_count"] == 3
+    assert [entry["count"] for entry in stats["daily"]] == [1, 2]
+
+    stats_response = await client.get("/stats/batch2")
+    assert stats_response.json()["visit_count"] == 1
+
+    result = await db_session.execute(select(URLVisit).where(URLVisit.url_id == first.id))
+    assert len(result.scalars().all()) == 3
+
+
+@pytest.mark.asyncio
+async def test_record_visits_adds_to_existing_daily_row(db_session, client: AsyncClient):
+    """Upsert should add the batch count to an existing day."""
+    url = await create_url(db_session, "batch3")
+    today = datetime.now(timezone.utc).date()
+    db_session.add(URLDailyStat(url_id=url.id, day=today, count=5))
+    await db_session.commit()
+
+    now = datetime.now(timezone.utc)
+    await url_repo.record_visits(db_session, [(url.id, "10.0.0.1", now)] * 2)
+    await db_session.commit()
+
+    stats_response = await client.get("/stats/batch3?days=1")
+    assert stats_response.json()["daily"] == [{"day": today.isoformat(), "count": 7}]
+
+
+@pytest.mark.asyncio
+async def test_visit_tracker_flushes_on_stop(db_session, client: AsyncClient):
+    """Queued visits should be written by the time stop() returns."""
+    url = await create_url(db_session, "queued1")
+
+    @asynccontextmanager
+    async def session_factory():
+        yield db_session
+
+    tracker = VisitTracker(session_factory, flush_interval=10)
+    assert not tracker.track(Visit(url.id, "10.0.0.1", datetime.now(timezone.utc)))
+
+    tracker.start()
+    for _ in range(3):
+        assert tracker.track(Visit(url.id, "10.0.0.1", datetime.now(timezone.utc)))
+    await tracker.stop()
+
+    stats_response = await client.get("/stats/queued1")
+    assert stats_response.json()["visit_count"] == 3
+
+
+@pytest.mark.asyncio
+async def test_visit_tracker_retries_batch_after_lost_connection(db_session, client: AsyncClient):
+    """A batch that hits a stale connection is written again on a fresh one, not dropped."""
+    url = await create_url(db_session, "queued4")
+    calls = 0
+
+    @asynccontextmanager
+    async def session_factory():
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise DBAPIError("SELECT 1", None, ConnectionResetError("connection lost"), connection_invalidated=True)
+        yield db_session
+
+    tracker = VisitTracker(session_factory, flush_interval=10)
+    tracker.start()
+    for _ in range(2):
+        assert tracker.track(Visit(url.id, "10.0.0.1", datetime.now(timezone.utc)))
+    await tracker.stop()
+
+    assert calls == 2
+    stats_response = await client.get("/stats/queued4")
+    assert stats_response.json()["visit_count"] == 2
+
+
+@pytest.mark.asyncio
+async def test_visit_tracker_stop_during_write_does_not_rewrite_batch(
+    db_connection, db_session, client: AsyncClient
+):
+    """Stopping while a batch is finishing its write must not write it again."""
+    url = await create_url(db_session, "queued2")
+    committed = asyncio.Event()
+    release = asyncio.Event()
+
+    @asynccontextmanager
+    async def slow_close_session():
+        # Commit has happened; hold the write open as a slow close would
+        async with SESSION_MAKER(bind=db_connection) as session:
+            yield session
+        committed.set()
+        await release.wait()
+
+    tracker = VisitTracker(slow_close_session, flush_interval=0.01)
+    tracker.start()
+    assert tracker.track(Visit(url.id, "10.0.0.1", datetime.now(timezone.utc)))
+    await asyncio.wait_for(committed.wait(), 5)
+
+    stopping = asyncio.create_task(tracker.stop())
+    await asyncio.sleep(0.01)
+    assert not stopping.done()
+    release.set()
+    await stopping
+
+    stats_response = await client.get("/stats/queued2")
+    assert stats_response.json()["visit_count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_visit_tracker_counts_unique_visitors_without_rows(
+    db_session, client: AsyncClient, fake_redis
+):
+    """With Redis, uniques go to a HyperLogLog and rows can be skipped."""
+    url = await create_url(db_session, "uniq1")
+
+    @asynccontextmanager
+    async def session_factory():
+        yield db_session
+
+    tracker = VisitTracker(session_factory, redis=fake_redis, store_rows=False)
+    tracker.start()
+    for ip in ("10.0.0.1", "10.0.0.2", "10.0.0.1"):
+        assert tracker.track(Visit(url.id, ip, datetime.now(timezone.utc)))
+    await tracker.stop()
+
+    stats = (await client.get("/stats/uniq1")).json()
+    assert stats["visit_count"] == 3
+    assert stats["unique_visitors"] == 2
+
+    result = await db_session.execute(select(URLVisit).where(URLVisit.url_id == url.id))
+    assert result.scalars().all() == []
+
+
+@pytest.mark.asyncio
+async def test_unique_visitors_survive_losing_the_hyperloglog(
+    db_session, client: AsyncClient, fake_redis
+):
+    """Each write persists PFCOUNT, so stats keep it after Redis drops the key."""
+    url = await create_url(db_session, "uniq2")
+
+    @asynccontextmanager
+    async def session_factory():
+        yield db_session
+
+    tracker = VisitTracker(session_factory, redis=fake_redis, store_rows=False)
+    tracker.start()
+    for ip in ("10.0.0.1", "10.0.0.2", "10.0.0.1"):
+        assert tracker.track(Visit(url.id, ip, datetime.now(timezone.utc)))
+    await tracker.stop()
+
+    stored = await db_session.scalar(select(URL.unique_visitors).where(URL.id == url.id))
+    assert stored == 2
+
+    fake_redis.hll.clear()
+    fake_redis.store.clear()
+    await client.get("/uniq2", follow_redirects=False)
+
+    stats = (await client.get("/stats/uniq2")).json()
+    assert stats["visit_count"] == 4
+    assert stats["unique_visitors"] == 2
+
+
+@pytest.mark.asyncio
+async def test_record_visits_stores_invalid_ip_as_null(db_session):
+    """Addresses that aren't valid IPs should be stored as NULL, not rejected."""
+    url = await create_url(db_session, "inet1")
+
+    now = datetime.now(timezone.utc)
+    await url_repo.record_visits(db_session, [(url.id, "unknown", now), (url.id, "::1", now)])
+    await db_session.commit()
+
+    result = await db_session.execute(
+        select(URLVisit.ip).where(URLVisit.url_id == url.id).order_by(URLVisit.id)
+    )
+    assert [ip and str(ip) for ip in result.scalars().all()] == [None, "::1"]
+
+
+@pytest.mark.asyncio
+async def test_visit_partitions_route_rows_and_drop_old_months(db_session):
+    """Visits should land in their month's partition; old months drop as tables."""
+    url = await create_url(db_session, "part1")
+    now = datetime.now(timezone.utc)
+    last_month = (now.replace(day=1) - timedelta(days=1)).replace(hour=12)
+
+    conn = await db_session.connection()
+    await partitions.ensure_visit_partitions(conn, months_ahead=1, today=last_month.date())
+    await url_repo.record_visits(db_session, [(url.id, "10.0.0.1", last_month), (url.id, "10.0.0.2", now)])
+    await db_session.commit()
+
+    result = await db_session.execute(text("SELECT tableoid::regclass::text FROM url_visits ORDER BY visited_at"))
+    assert result.scalars().all() == [
+        partitions.partition_name(last_month.date()),
+        partitions.partition_name(now.date()),
+    ]
+
+    conn = await db_session.connection()
+    dropped = await partitions.drop_visit_partitions(conn, keep_months=1, today=now.date())
+    await db_session.commit()
+    assert dropped == [partitions.partition_name(last_month.date())]
+
+    result = await db_session.execute(select(URLVisit.ip).where(URLVisit.url_id == url.id))
+    assert [str(ip) for ip in result.scalars().all()] == ["10.0.0.2"]
+
+
+@pytest.mark.asyncio
+async def test_visit_partitions_move_rows_out_of_a_non_empty_default(db_session):
+    """After a missed rotation, the month's rows move out of the default and later months still get created."""
+    url = await create_url(db_session, "part2")
+    missed = datetime(2031, 1, 15, tzinfo=timezone.utc)
+    await url_repo.record_visits(db_session, [(url.id, "10.0.0.1", missed)])
+
+    conn = await db_session.connection()
+    result = await conn.execute(text("SELECT tableoid::regclass::text FROM url_visits WHERE url_id = :id"), {"id": url.id})
+    assert result.scalars().all() == ["url_visits_default"]
+
+    failed = await partitions.ensure_visit_partitions(conn, months_ahead=2, today=date(2031, 1, 10))
+    await db_session.commit()
+    assert failed == []
+
+    result = await db_session.execute(
+        text("SELECT tableoid::regclass::text, host(ip) FROM url_visits WHERE url_id = :id"), {"id": url.id}
+    )
+    assert result.all() == [("url_visits_2031_01", "10.0.0.1")]
+    result = await db_session.execute(partitions._LIST_PARTITIONS)
+    assert {"url_visits_2031_02", "url_visits_2031_03", "url_visits_default"} <= set(result.scalars())
+
+
+@pytest.mark.asyncio
+async def test_redirects_are_queued_until_the_tracker_flushes(db_connection, client: AsyncClient):
+    """With the app's tracker running, redirects only queue; flush() writes them in one batch."""
+    create_response = await client.post("/shorten", json={"original_url": "https://example.com/q"})
+    short_code = create_response.json()["short_code"]
+
+    # Long interval: nothing is written until the explicit flush
+    tracker = VisitTracker(lambda: SESSION_MAKER(bind=db_connection), flush_interval=10)
+    tracker.start()
+    app.state.visit_tracker = tracker
+    try:
+        for _ in range(3):
+            redirect_response = await client.get(f"/{short_code}", follow_redirects=False)
+            assert redirect_response.status_code == 307
+        assert (await client.get(f"/stats/{short_code}")).json()["visit_count"] == 0
+
+        await tracker.flush()
+        assert tracker.running
+
+        stats = (await client.get(f"/stats/{short_code}?days=1")).json()
+        assert stats["visit_count"] == 3
+        assert [entry["count"] for entry in stats["daily"]] == [3]
+    finally:
+        app.state.visit_tracker = None
+        await tracker.stop()
+
+
+@pytest.mark.asyncio
+async def test_visit_tracker_flush_waits_for_in_flight_batch(
+    db_connection, db_session, client: AsyncClient
+):
+    """flush() should let a batch being written finish, then write the queue, without stopping."""
+    url = await create_url(db_session, "queued3")
+    committed = asyncio.Event()
+    release = asyncio.Event()
+
+    @asynccontextmanager
+    async def slow_close_session():
+        async with SESSION_MAKER(bind=db_connection) as session:
+            yield session
+        committed.set()
+        await release.wait()
+
+    tracker = VisitTracker(slow_close_session, flush_interval=0.01)
+    tracker.start()
+    flusher = tracker._task
+    try:
+        assert tracker.track(Visit(url.id, "10.0.0.1", datetime.now(timezone.utc)))
+        await asyncio.wait_for(committed.wait(), 5)
+        for ip in ("10.0.0.2", "10.0.0.3"):
+            assert tracker.track(Visit(url.id, ip, datetime.now(timezone.utc)))
+
+        flushing = asyncio.create_task(tracker.flush())
+        await asyncio.sleep(0.01)
+        assert not flushing.done()
+        release.set()
+        await flushing
+
+        assert tracker.running and tracker._task is flusher
+        stats_response = await client.get("/stats/queued3")
+        assert stats_response.json()["visit_count"] == 3
+    finally:
+        release.set()
+        await tracker.stop()